@@ -0,0 +1,49 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+# PBKDF2 releases the GIL, so a few threads hash in parallel without letting
+# a burst of signups queue unbounded work behind the event loop.
+hash_workers = getattr(settings, "PASSWORD_HASH_WORKERS", None) or os.cpu_count() or 2
+password_hashers = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="password-hash")
+
+
+def create_account(username, email, phone_number, password=None, password_hash=None):
+    """Create a user, its profile and its API token in one transaction.
+
+    That is one INSERT per table: the profile is created by the
+    ``create_user_profile`` signal with the phone number already set, and
+    nothing is saved twice. Pass ``password_hash`` when the password was
+    hashed beforehand, e.g. by ``hash_password``.
+    """
+    user = User(username=User.normalize_username(username), email=User.objects.normalize_email(email))
+    if password_hash is None:
+        user.set_password(password)
+    else:
+        user.password = password_hash
+    user._pending_phone_number = phone_number
+
+    with transaction.atomic():
+        user.save()
+        token = Token.objects.create(user=user)
+    return user, token
+
+
+async def hash_password(password):
+    """Hash ``password`` on the ``password_hashers`` pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_hashers, make_password, password)
+
+
+async def acreate_account(username, email, phone_number, password):
+    password_hash = await hash_password(password)
+    return await sync_to_async(create_account)(
+        username, email, phone_number, password_hash=password_hash
+    )
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class EventConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'event'
+
+    def ready(self):
+        from . import authentication  # noqa: F401 -- connects the token cache signals
+        from .search import repair_search_index
+
+        post_migrate.connect(repair_search_index, sender=self)
@@ -0,0 +1,145 @@
+"""Async versions of the hot endpoints, served when ``ASYNC_VIEWS`` is on.
+
+They only pay off when the project is served through ``main.asgi``; under
+WSGI Django runs each of them in a throwaway event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .accounts import acreate_account
+from .cache import public_events_cache
+from .conditional import ConditionalGetMixin
+from .models import Event, InboundMessage
+from .pagination import EventCursorPagination
+from .search import EventSearchFilter
+from .serializers import AttendeeSerializer, EventSerializer, UserSerializer
+from .utils import enqueue_answer, parse_inbound_message
+from .views import register_attendee
+
+
+async def request_data(request):
+    """Parse the body with the parsers the DRF views use: JSON, form or multipart.
+
+    Raises ``ParseError`` or ``UnsupportedMediaType`` like ``request.data`` does.
+    """
+    request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+    # Multipart parsing reads the body from a file-like object; keep it off the event loop.
+    return await sync_to_async(lambda: request.data)()
+
+
+def error_response(exc):
+    return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+
+
+class PublicEvents(ConditionalGetMixin):
+    """``PublicEventListView`` on the async ORM, sharing its cache entries."""
+
+    def __init__(self):
+        self.paginator = EventCursorPagination()
+
+    async def get(self, request):
+        # Only for query_params; the paginator expects a DRF request.
+        request = Request(request)
+
+        async def render():
+            queryset = EventSearchFilter().filter_queryset(request, Event.objects.with_list_stats(), self)
+            validators = await self.alist_validators(request, queryset)
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            data = self.paginator.get_paginated_response(EventSerializer(page, many=True).data).data
+            return validators, data
+
+        try:
+            validators, data = await public_events_cache.aget_or_compute(
+                request.build_absolute_uri(), render
+            )
+        except NotFound as exc:
+            return error_response(exc)
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400)
+        return self.conditional_response(request, validators, lambda: JsonResponse(data))
+
+
+@require_safe
+async def public_events(request):
+    return await PublicEvents().get(request)
+
+
+@csrf_exempt
+@require_POST
+async def register_event(request, registration_link=None):
+    """``EventRegistrationView``; the write itself stays one sync transaction."""
+    try:
+        data = await request_data(request)
+    except APIException as exc:
+        return error_response(exc)
+
+    try:
+        event = await Event.objects.aget(registration_link=registration_link)
+    except Event.DoesNotExist:
+        return JsonResponse({"detail": "No Event matches the given query."}, status=404)
+
+    serializer = AttendeeSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    try:
+        await sync_to_async(register_attendee)(serializer, event)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    return JsonResponse(serializer.data, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def whatsapp_webhook(request):
+    """``utils.whatsapp_webhook``: store the message and hand it to a worker."""
+    try:
+        data = await request_data(request)
+    except APIException as exc:
+        return error_response(exc)
+    message_id, phone_number, text = parse_inbound_message(data if hasattr(data, "get") else {})
+    if not message_id or not phone_number or not text:
+        return JsonResponse({"message": "Invalid payload"}, status=400)
+
+    try:
+        inbound = await InboundMessage.objects.acreate(
+            message_id=message_id, phone_number=phone_number, body=text
+        )
+    except IntegrityError:
+        return JsonResponse({"success": True, "duplicate": True})
+
+    # Publishing to the broker is blocking I/O.
+    await sync_to_async(enqueue_answer)(inbound.pk)
+    return JsonResponse({"success": True})
+
+
+@csrf_exempt
+@require_POST
+async def register(request):
+    """``UserRegistrationView`` with the password hashed off the event loop."""
+    try:
+        data = await request_data(request)
+    except APIException as exc:
+        return error_response(exc)
+
+    serializer = UserSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+
+    validated = serializer.validated_data
+    user, token = await acreate_account(
+        validated["username"], validated["email"], validated["phone_number"], validated["password"]
+    )
+    return JsonResponse(
+        {
+            "user": UserSerializer(user).data,
+            "message": "User registered successfully",
+            "token": token.key,
+        },
+        status=201,
+    )
@@ -0,0 +1,129 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import LRUCache
+
+# Tokens resolved in this process. Other processes do not see invalidations
+# here, so entries only live for TOKEN_AUTH_LOCAL_CACHE_TTL seconds (off by default).
+local_tokens = LRUCache(
+    maxsize=getattr(settings, "TOKEN_AUTH_LOCAL_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "TOKEN_AUTH_LOCAL_CACHE_TTL", 0),
+)
+
+
+# What is cached of a user: enough for permission checks and serializers,
+# but not the password hash. The password is loaded on access, if ever.
+CACHED_USER_FIELDS = (
+    "id",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "last_login",
+    "date_joined",
+)
+CACHED_TOKEN_FIELDS = ("key", "user_id", "created")
+
+
+def token_cache_key(key):
+    # Hashed so raw tokens never appear in the cache's key space.
+    return "auth-token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def shared_cache_ttl():
+    """Seconds tokens are kept in the ``default`` cache; 0 when it is not shared.
+
+    ``TOKEN_AUTH_CACHE_TTL`` defaults to 0 unless Redis is configured: a
+    per-process cache is not invalidated across workers, so a token deleted
+    by one worker would still be accepted by the others.
+    """
+    return getattr(settings, "TOKEN_AUTH_CACHE_TTL", 0)
+
+
+def credentials_entry(user, token):
+    return (
+        {field: getattr(user, field) for field in CACHED_USER_FIELDS},
+        {field: getattr(token, field) for field in CACHED_TOKEN_FIELDS},
+    )
+
+
+def entry_credentials(entry):
+    """Rebuild the ``(user, token)`` pair of a cached entry as fresh instances."""
+    user_values, token_values = entry
+    user = from_cached_values(User, user_values)
+    token = from_cached_values(Token, token_values)
+    token.user = user
+    return user, token
+
+
+def from_cached_values(model, values):
+    # from_db() wants the values in field order; the missing fields are deferred.
+    fields = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(model.objects.db, fields, [values[field] for field in fields])
+
+
+def invalidate_token(key):
+    def forget():
+        local_tokens.delete(key)
+        cache.delete(token_cache_key(key))
+
+    forget()
+    # Again after commit, in case a request cached the old row in between.
+    transaction.on_commit(forget)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that remembers which user a token belongs to.
+
+    Resolved tokens are kept in the shared cache for ``TOKEN_AUTH_CACHE_TTL``
+    seconds, and optionally in process for ``TOKEN_AUTH_LOCAL_CACHE_TTL``
+    seconds, so most requests skip the token and user query. Deleting a token
+    (logout, rotation) and saving its user (deactivation) drop the entry.
+    Each request gets its own instances, without the password hash.
+    """
+
+    def authenticate_credentials(self, key):
+        ttl = shared_cache_ttl()
+        entry = local_tokens.get(key) if local_tokens.ttl else None
+        if entry is None and ttl:
+            entry = cache.get(token_cache_key(key))
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            entry = credentials_entry(user, token)
+            if ttl:
+                cache.set(token_cache_key(key), entry, ttl)
+        else:
+            user, token = entry_credentials(entry)
+        if local_tokens.ttl:
+            local_tokens.set(key, entry)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, raw=False, **kwargs):
+    # A cached user would keep an old is_active flag or username.
+    if created or raw:
+        return
+    for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+        invalidate_token(key)
@@ -0,0 +1,186 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    """A small thread-safe, in-process LRU cache with a time to live.
+
+    Entries are evicted least recently used first once ``maxsize`` is reached,
+    and are treated as missing ``ttl`` seconds after they were stored. Hits and
+    misses are counted so the savings can be reported with ``stats()``.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+class ResponseCache:
+    """Shared cache of rendered responses with generation-based invalidation.
+
+    Entries live in the Django cache (Redis in production) together with the
+    generation they were computed for. ``invalidate()`` bumps the generation,
+    which makes every entry stale at once. A stale or expired entry is
+    recomputed by the one worker that wins a short lock while the others keep
+    serving the stale copy, so a popular page never stampedes the database.
+    Hits, stale hits and misses are counted in the cache as well.
+    """
+
+    def __init__(self, prefix, fresh_for=60, keep_for=3600, lock_timeout=30, alias="default"):
+        self.prefix = prefix
+        self.fresh_for = fresh_for
+        self.keep_for = keep_for
+        self.lock_timeout = lock_timeout
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def generation(self):
+        return self.cache.get_or_set(self.key("generation"), 1, timeout=None)
+
+    def invalidate(self):
+        key = self.key("generation")
+        self.cache.add(key, 1, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(); starting over still invalidates.
+            self.cache.set(key, int(time.time()), timeout=None)
+
+    def get_or_compute(self, name, compute):
+        """Return the cached value for ``name``, calling ``compute()`` when needed."""
+        digest = hashlib.sha1(name.encode()).hexdigest()
+        entry_key = self.key(f"entry:{digest}")
+        lock_key = self.key(f"lock:{digest}")
+        generation = self.generation()
+
+        entry = self.cache.get(entry_key)
+        if entry is not None:
+            entry_generation, computed_at, value = entry
+            if entry_generation == generation and computed_at + self.fresh_for > time.time():
+                self.count("hits")
+                return value
+            if not self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+                self.count("stale")
+                return value
+            locked = True
+        else:
+            # Nothing to fall back on, so every worker computes on a cold miss.
+            locked = False
+
+        self.count("misses")
+        try:
+            value = compute()
+            self.cache.set(entry_key, (generation, time.time(), value), timeout=self.keep_for)
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+        return value
+
+    async def aget_or_compute(self, name, compute):
+        """``get_or_compute`` for async views; ``compute`` is a coroutine function."""
+        digest = hashlib.sha1(name.encode()).hexdigest()
+        entry_key = self.key(f"entry:{digest}")
+        lock_key = self.key(f"lock:{digest}")
+        generation = await self.cache.aget_or_set(self.key("generation"), 1, timeout=None)
+
+        entry = await self.cache.aget(entry_key)
+        if entry is not None:
+            entry_generation, computed_at, value = entry
+            if entry_generation == generation and computed_at + self.fresh_for > time.time():
+                await self.acount("hits")
+                return value
+            if not await self.cache.aadd(lock_key, 1, timeout=self.lock_timeout):
+                await self.acount("stale")
+                return value
+            locked = True
+        else:
+            locked = False
+
+        await self.acount("misses")
+        try:
+            value = await compute()
+            await self.cache.aset(entry_key, (generation, time.time(), value), timeout=self.keep_for)
+        finally:
+            if locked:
+                await self.cache.adelete(lock_key)
+        return value
+
+    async def acount(self, metric):
+        key = self.key(f"metrics:{metric}")
+        if not await self.cache.aadd(key, 1, timeout=None):
+            try:
+                await self.cache.aincr(key)
+            except ValueError:
+                pass
+
+    def count(self, metric):
+        key = self.key(f"metrics:{metric}")
+        if not self.cache.add(key, 1, timeout=None):
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                pass
+
+    def stats(self):
+        names = ("hits", "stale", "misses")
+        values = self.cache.get_many([self.key(f"metrics:{name}") for name in names])
+        return {name: values.get(self.key(f"metrics:{name}"), 0) for name in names}
+
+
+public_events_cache = ResponseCache(
+    "public-events",
+    fresh_for=getattr(settings, "PUBLIC_EVENTS_CACHE_TTL", 60),
+)
@@ -0,0 +1,76 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """ETag support for the event endpoints, plus Last-Modified for single events.
+
+    The validators are computed from a few columns of the rows a response is
+    made of (``validator_fields``) rather than from the rendered body, so a
+    request carrying ``If-None-Match`` or ``If-Modified-Since`` can be answered
+    with a 304 before anything is serialized. Registrations and seat changes
+    touch ``Event.updated_at``, so they move Last-Modified too.
+    """
+
+    validator_fields = (
+        "id",
+        "updated_at",
+        "attendee_count",
+        "creator_username",
+        "creator_phone",
+        "capacity",
+        "seats_taken",
+    )
+
+    def list_validators(self, request, queryset):
+        """Validators of the page of ``queryset`` that ``request`` asks for.
+
+        Pages only get an ETag. An event leaving the page does not change the
+        newest ``updated_at`` of the rows left on it, so a Last-Modified date
+        could answer 304 for a page that changed.
+        """
+        page = self.paginator.get_page_queryset(queryset, request, view=self)
+        digest, _ = self.make_validators(request, page.values_list(*self.validator_fields))
+        return digest, None
+
+    async def alist_validators(self, request, queryset):
+        page = self.paginator.get_page_queryset(queryset, request, view=self)
+        rows = [row async for row in page.values_list(*self.validator_fields)]
+        digest, _ = self.make_validators(request, rows)
+        return digest, None
+
+    def object_validators(self, request, obj):
+        row = tuple(getattr(obj, field) for field in self.validator_fields)
+        return self.make_validators(request, [row])
+
+    def make_validators(self, request, rows):
+        """Return ``(digest, last_modified)`` for the given validator rows."""
+        rows = list(rows)
+        digest = hashlib.sha1(
+            repr((request.build_absolute_uri(), rows)).encode()
+        ).hexdigest()
+        updated_at = self.validator_fields.index("updated_at")
+        last_modified = max((row[updated_at] for row in rows), default=None)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        return digest, last_modified
+
+    def conditional_response(self, request, validators, respond):
+        """Answer with a 304 when the client is up to date, otherwise call ``respond()``."""
+        digest, last_modified = validators
+        # Each renderer produces a different body, so it is part of the tag.
+        # Plain Django requests (the async views) always answer with JSON.
+        renderer = getattr(request, "accepted_renderer", None)
+        etag = f'"{digest}-{renderer.format if renderer else "json"}"'
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = respond()
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,67 @@
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+ATTENDEE_EXPORT_FIELDS = ("id", "name", "email", "phone_number", "status", "registered_at")
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    """A file-like object that hands back what is written to it, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def attendee_rows(queryset, chunk_size=None):
+    """Yield the export fields of each attendee without building model instances.
+
+    ``iterator()`` uses a server-side cursor where the database supports it,
+    so only ``chunk_size`` rows are held at a time.
+    """
+    chunk_size = chunk_size or getattr(settings, "ATTENDEE_EXPORT_CHUNK_SIZE", 2000)
+    queryset = queryset.order_by("registered_at", "id").values_list(*ATTENDEE_EXPORT_FIELDS)
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def csv_lines(rows, lines_per_write=500):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ATTENDEE_EXPORT_FIELDS)
+    buffer = []
+    for row in rows:
+        buffer.append(writer.writerow(
+            value.isoformat() if hasattr(value, "isoformat") else value for value in row
+        ))
+        if len(buffer) >= lines_per_write:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def ndjson_lines(rows, lines_per_write=500):
+    encoder = DjangoJSONEncoder()
+    buffer = []
+    for row in rows:
+        buffer.append(encoder.encode(dict(zip(ATTENDEE_EXPORT_FIELDS, row))) + "\n")
+        if len(buffer) >= lines_per_write:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_attendees(queryset, fmt, filename):
+    """Return a response that streams the attendees in ``queryset`` as CSV or NDJSON."""
+    lines = csv_lines if fmt == "csv" else ndjson_lines
+    response = StreamingHttpResponse(
+        lines(attendee_rows(queryset)), content_type=CONTENT_TYPES[fmt]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
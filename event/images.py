@@ -0,0 +1,53 @@
+import hashlib
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+DEFAULT_VARIANTS = {"thumb": (320, 320), "card": (800, 450)}
+
+
+def flyer_variant_sizes():
+    return getattr(settings, "FLYER_VARIANTS", DEFAULT_VARIANTS)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def variant_name(flyer_name, digest, variant):
+    """Where a derivative lives: a ``variants`` folder next to the original."""
+    return posixpath.join(posixpath.dirname(flyer_name), "variants", f"{digest}-{variant}.webp")
+
+
+def render_variant(data, size, quality=None):
+    """Return ``data`` as WebP bytes scaled down to fit inside ``size``."""
+    quality = quality or getattr(settings, "FLYER_VARIANT_QUALITY", 80)
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, "WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+def build_flyer_variants(flyer):
+    """Make the derivatives of the ``flyer`` file; the result is stored in ``Event.flyer_variants``.
+
+    Derivatives are named by the hash of the original's content, so a file
+    that already exists in the storage is reused rather than rendered again.
+    """
+    with flyer.open("rb") as source:
+        data = source.read()
+    digest = content_hash(data)
+
+    files = {}
+    for variant, size in flyer_variant_sizes().items():
+        name = variant_name(flyer.name, digest, variant)
+        if not flyer.storage.exists(name):
+            name = flyer.storage.save(name, ContentFile(render_variant(data, size)))
+        files[variant] = name
+    return {"source": flyer.name, "hash": digest, "files": files}
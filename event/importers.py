@@ -0,0 +1,206 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+
+from .models import Attendee, EmailOutbox, Event
+from .phone import normalize_phone_number
+from .serializers import AttendeeSerializer
+from .tasks import wake_email_outbox
+
+CSV_TYPES = ("text/csv", "application/csv", "application/vnd.ms-excel")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+NOT_UTF8 = "The line is not UTF-8 encoded."
+
+
+def upload_format(upload):
+    """Guess whether ``upload`` is CSV or NDJSON from its name and content type."""
+    name = (upload.name or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or upload.content_type in NDJSON_TYPES:
+        return "ndjson"
+    if name.endswith(".csv") or upload.content_type in CSV_TYPES:
+        return "csv"
+    return None
+
+
+def read_rows(upload, fmt):
+    """Yield ``(row number, record)`` pairs from ``upload`` one line at a time.
+
+    The file is decoded as it is read, so only the current line is held in
+    memory. Lines that are not valid records, including lines that are not
+    UTF-8, are yielded as error strings so the rest of the file still loads.
+    """
+    undecodable = []
+    lines = decoded_lines(upload.file, undecodable)
+    if fmt == "csv":
+        yield from csv_rows(lines, undecodable)
+        return
+    for number, line in enumerate(lines, start=1):
+        if undecodable:
+            undecodable.pop()
+            yield number, NOT_UTF8
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, "Invalid JSON."
+            continue
+        if not isinstance(record, dict):
+            yield number, "Expected a JSON object."
+            continue
+        yield number, record
+
+
+def decoded_lines(binary, undecodable):
+    """Decode ``binary`` line by line; lines that fail are yielded empty and noted in ``undecodable``."""
+    for number, raw in enumerate(binary, start=1):
+        if number == 1:
+            raw = raw.removeprefix(codecs.BOM_UTF8)
+        try:
+            yield raw.decode("utf-8")
+        except UnicodeDecodeError:
+            undecodable.append(number)
+            yield "\n"
+
+
+def csv_rows(lines, undecodable):
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or undecodable:
+        raise ParseError("The CSV file has no readable header row.")
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            record = None
+        except csv.Error as exc:
+            record = f"Invalid CSV: {exc}."
+        # Undecodable lines were read as blank ones, which DictReader skips.
+        while undecodable:
+            yield undecodable.pop(0), NOT_UTF8
+        if record is None:
+            return
+        yield reader.line_num, record
+
+
+class AttendeeImport:
+    """Load attendees for one event from a CSV or NDJSON upload.
+
+    Rows are validated with ``AttendeeSerializer`` and written in batches of
+    ``ATTENDEE_IMPORT_BATCH_SIZE`` with ``bulk_create``, each batch in its own
+    transaction. Emails already registered for the event are reported as
+    duplicates and skipped. On events with a capacity the event row is locked
+    while a batch is inserted so seats are handed out in file order and the
+    rest of the rows join the waitlist. Confirmation emails are only queued in
+    the outbox when ``notify`` is set.
+    """
+
+    def __init__(self, event, notify=False, batch_size=None, max_errors=None):
+        self.event = event
+        self.notify = notify
+        self.batch_size = batch_size or getattr(settings, "ATTENDEE_IMPORT_BATCH_SIZE", 500)
+        self.max_errors = max_errors or getattr(settings, "ATTENDEE_IMPORT_MAX_ERRORS", 1000)
+        self.created = self.waitlisted = self.duplicates = self.invalid = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = iter(rows)
+        while batch := list(islice(rows, self.batch_size)):
+            self.import_batch(batch)
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "waitlisted": self.waitlisted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "errors_truncated": self.invalid + self.duplicates > len(self.errors),
+        }
+
+    def error(self, row, errors):
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "errors": errors})
+
+    def import_batch(self, batch):
+        valid = {}
+        for row, record in batch:
+            if isinstance(record, str):
+                self.invalid += 1
+                self.error(row, {"non_field_errors": [record]})
+                continue
+            serializer = AttendeeSerializer(data=record)
+            if not serializer.is_valid():
+                self.invalid += 1
+                self.error(row, serializer.errors)
+                continue
+            email = serializer.validated_data["email"]
+            if email in valid:
+                self.duplicate(row)
+                continue
+            valid[email] = (row, serializer.validated_data)
+
+        if not valid:
+            return
+
+        with transaction.atomic():
+            event = self.event
+            if event.capacity is not None:
+                event = Event.objects.select_for_update().only("pk", "capacity", "seats_taken").get(pk=event.pk)
+
+            registered = set(
+                event.attendees.filter(email__in=list(valid)).values_list("email", flat=True)
+            )
+            free_seats = None if event.capacity is None else max(event.capacity - event.seats_taken, 0)
+
+            attendees = []
+            for email, (row, data) in valid.items():
+                if email in registered:
+                    self.duplicate(row)
+                    continue
+                attendee = Attendee(event_id=event.pk, **data)
+                attendee.phone_e164 = normalize_phone_number(attendee.phone_number)
+                if free_seats is not None:
+                    if free_seats:
+                        free_seats -= 1
+                    else:
+                        attendee.status = "WAITLISTED"
+                attendees.append(attendee)
+
+            # A concurrent registration can still win the unique constraint,
+            # so check which of the rows actually went in.
+            Attendee.objects.bulk_create(attendees, ignore_conflicts=True)
+            inserted = set(
+                Attendee.objects.filter(pk__in=[a.pk for a in attendees]).values_list("pk", flat=True)
+            )
+            created = [a for a in attendees if a.pk in inserted]
+            for attendee in attendees:
+                if attendee.pk not in inserted:
+                    self.duplicate(valid[attendee.email][0])
+
+            if event.capacity is not None:
+                seats = sum(a.status == "CONFIRMED" for a in created)
+                Event.objects.filter(pk=event.pk).update(
+                    seats_taken=F("seats_taken") + seats, updated_at=timezone.now()
+                )
+
+            if self.notify and created:
+                EmailOutbox.objects.bulk_create(
+                    EmailOutbox.registration(attendee, self.event) for attendee in created
+                )
+                transaction.on_commit(wake_email_outbox)
+
+        self.created += len(created)
+        self.waitlisted += sum(a.status == "WAITLISTED" for a in created)
+
+    def duplicate(self, row):
+        self.duplicates += 1
+        self.error(row, {"email": [AttendeeSerializer.duplicate_message]})
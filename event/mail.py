@@ -0,0 +1,81 @@
+import logging
+from smtplib import SMTPServerDisconnected
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the SMTP session is unusable and worth reopening once.
+CONNECTION_ERRORS = (SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class BatchMailer:
+    """Send many email messages over one kept-alive SMTP connection.
+
+    ``send_mail`` opens and closes a session for every message, which
+    dominates the cost of bulk sends. The mailer keeps a single connection
+    open, reopens it once if the server drops it, and rolls over to a fresh
+    session every ``max_per_connection`` messages so long batches stay under
+    provider limits. Use it as a context manager so the last session is closed::
+
+        with BatchMailer() as mailer:
+            for message in messages:
+                mailer.send(message)
+    """
+
+    def __init__(self, max_per_connection=None, connection=None):
+        if max_per_connection is None:
+            max_per_connection = getattr(settings, "EMAIL_MAX_MESSAGES_PER_CONNECTION", 100)
+        self.max_per_connection = max_per_connection
+        self.connection = connection or get_connection(fail_silently=False)
+        self.is_open = False
+        self.sent_on_connection = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        if not self.is_open:
+            self.connection.open()
+            self.is_open = True
+            self.sent_on_connection = 0
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            try:
+                self.connection.close()
+            except Exception:
+                logger.warning("Failed to close SMTP connection cleanly", exc_info=True)
+
+    def send(self, message):
+        """Send ``message`` and report whether it was accepted by the server."""
+        for attempt in range(2):
+            try:
+                self.open()
+                self.connection.send_messages([message])
+            except CONNECTION_ERRORS:
+                self.close()
+                if attempt:
+                    logger.exception("SMTP connection lost sending to %s", message.to)
+                    return False
+                continue
+            except Exception:
+                logger.exception("Failed to send email to %s", message.to)
+                return False
+
+            self.sent_on_connection += 1
+            if self.sent_on_connection >= self.max_per_connection:
+                self.close()
+            return True
+        return False
+
+
+def send_messages(messages, max_per_connection=None):
+    """Send ``messages`` in one batch and return a success flag for each of them."""
+    with BatchMailer(max_per_connection=max_per_connection) as mailer:
+        return [mailer.send(message) for message in messages]
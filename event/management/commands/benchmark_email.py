@@ -0,0 +1,96 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.management.base import BaseCommand, CommandError
+
+from event.mail import BatchMailer
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept and discard messages."""
+
+    def reply(self, line):
+        time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 sink")
+            elif command == b"DATA":
+                self.reply("354 go ahead")
+                while (line := self.rfile.readline()) and line != b".\r\n":
+                    pass
+                self.reply("250 accepted")
+            elif command == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sending emails one send_mail call at a time with sending "
+        "them through BatchMailer. Without --host a local SMTP sink is "
+        "started; --latency adds a delay to each of its replies to mimic a "
+        "remote server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=200, help="Emails to send each way.")
+        parser.add_argument("--host", help="SMTP server to send to instead of the local sink.")
+        parser.add_argument("--port", type=int, default=25)
+        parser.add_argument("--latency", type=float, default=0.005, help="Seconds per sink reply.")
+        parser.add_argument("--max-per-connection", type=int, default=100)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        sink = None
+        host, port = options["host"], options["port"]
+        if host is None:
+            sink = SinkServer(("127.0.0.1", 0), SinkHandler)
+            sink.latency = options["latency"]
+            threading.Thread(target=sink.serve_forever, daemon=True).start()
+            host, port = sink.server_address
+
+        def connection():
+            return get_connection(
+                "django.core.mail.backends.smtp.EmailBackend",
+                host=host, port=port, username="", password="", use_tls=False, use_ssl=False,
+            )
+
+        def message(n):
+            return EmailMessage("Benchmark", "Hello", "bench@example.com", [f"guest{n}@example.com"])
+
+        try:
+            started = time.perf_counter()
+            for n in range(count):
+                send_mail("Benchmark", "Hello", "bench@example.com", [f"guest{n}@example.com"], connection=connection())
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with BatchMailer(max_per_connection=options["max_per_connection"], connection=connection()) as mailer:
+                failed = sum(not mailer.send(message(n)) for n in range(count))
+            batched = time.perf_counter() - started
+        finally:
+            if sink is not None:
+                sink.shutdown()
+                sink.server_close()
+
+        if failed:
+            raise CommandError(f"BatchMailer failed {failed} of {count} emails.")
+        self.stdout.write(f"send_mail: {count / single:.1f} emails/s")
+        self.stdout.write(
+            f"BatchMailer: {count / batched:.1f} emails/s ({single / batched:.1f}x), "
+            f"{-(-count // options['max_per_connection'])} connections"
+        )
@@ -0,0 +1,74 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent requests at a running server and report throughput "
+        "and latency, to compare WSGI workers with the ASGI views. With --json "
+        "the requests are POSTs; {n} in the body is replaced by the request "
+        "number so every registration or signup is a new one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("base_url", help="e.g. http://localhost:8000")
+        parser.add_argument("--path", default="/api/public-events/")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--json",
+            help='POST this body, e.g. \'{"name": "Guest {n}", "email": "guest{n}@example.com", '
+            '"phone_number": "08012345678"}\'',
+        )
+
+    def handle(self, *args, **options):
+        url = options["base_url"].rstrip("/") + options["path"]
+        body = options["json"]
+        if body is not None:
+            try:
+                json.loads(body.replace("{n}", "0"))
+            except ValueError as exc:
+                raise CommandError(f"--json is not valid JSON: {exc}")
+        local = threading.local()
+
+        def fetch(n):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                if body is None:
+                    response = local.session.get(url, timeout=30)
+                else:
+                    response = local.session.post(
+                        url,
+                        data=body.replace("{n}", str(n)),
+                        headers={"Content-Type": "application/json"},
+                        timeout=30,
+                    )
+                status = response.status_code
+            except requests.RequestException:
+                status = None
+            return status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(fetch, range(options["requests"])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for status, latency in results if status and status < 400)
+        errors = len(results) - len(latencies)
+        if not latencies:
+            raise CommandError(f"All {errors} requests to {url} failed.")
+
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        self.stdout.write(
+            f"{len(results) / elapsed:.1f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, "
+            f"{errors} errors"
+        )
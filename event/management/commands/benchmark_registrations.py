@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+from datetime import time as clock, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from event.models import Event
+from event.views import EventRegistrationView
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure registrations per second through the event registration view, "
+        "and the queries each one costs. Everything is rolled back afterwards; "
+        "with --concurrency the registrations commit and the seeded event is "
+        "deleted at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500, help="Registrations to time.")
+        parser.add_argument("--capacity", type=int, default=None, help="Give the event a capacity.")
+        parser.add_argument(
+            "--concurrency", type=int, default=1, help="Register from this many threads at once."
+        )
+
+    def handle(self, *args, **options):
+        self.view = EventRegistrationView.as_view()
+        self.factory = APIRequestFactory()
+        if options["concurrency"] > 1:
+            self.run_concurrently(options["count"], options["capacity"], options["concurrency"])
+            return
+
+        count = options["count"]
+        with transaction.atomic():
+            event = self.seed_event(options["capacity"])
+            for name, expected in (("new", 201), ("duplicate", 400)):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for n in range(count):
+                        self.expect(name, self.register(event, n), expected)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{name} registrations: {count / elapsed:.1f}/s, "
+                    f"{len(queries) / count:.1f} queries each"
+                )
+            transaction.set_rollback(True)
+
+    def run_concurrently(self, count, capacity, concurrency):
+        event = self.seed_event(capacity)
+        start = threading.Barrier(concurrency + 1)
+        failures = []
+
+        def worker(numbers):
+            start.wait()
+            try:
+                for n in numbers:
+                    response = self.register(event, n)
+                    if response.status_code != 201:
+                        failures.append(response)
+            finally:
+                close_old_connections()
+
+        threads = [
+            threading.Thread(target=worker, args=(range(first, count, concurrency),))
+            for first in range(concurrency)
+        ]
+        try:
+            # The outbox is drained by its periodic task; no broker round trip per registration.
+            with mock.patch("event.views.wake_email_outbox"):
+                for thread in threads:
+                    thread.start()
+                start.wait()
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+            if failures:
+                self.expect("concurrent", failures[0], 201)
+            event.refresh_from_db()
+            confirmed = event.attendees.filter(status="CONFIRMED").count()
+            if capacity is not None and (confirmed > capacity or event.seats_taken != confirmed):
+                raise CommandError(
+                    f"Oversold: {confirmed} confirmed, {event.seats_taken} seats taken, capacity {capacity}."
+                )
+            self.stdout.write(
+                f"concurrent registrations ({concurrency} threads): {count / elapsed:.1f}/s, "
+                f"{confirmed} confirmed, {event.attendee_count - confirmed} waitlisted"
+            )
+        finally:
+            event.creator.delete()
+
+    def seed_event(self, capacity):
+        creator = User.objects.create(username=f"registration-bench-{uuid.uuid4().hex[:8]}")
+        return Event.objects.create(
+            creator=creator,
+            title="Registration benchmark",
+            description="Seeded by benchmark_registrations",
+            location="Nowhere",
+            date=timezone.localdate() + timedelta(days=30),
+            time=clock(18),
+            capacity=capacity,
+        )
+
+    def register(self, event, n):
+        request = self.factory.post(
+            f"/api/register-event/{event.registration_link}/",
+            {"name": f"Guest {n}", "email": f"guest{n}@example.com", "phone_number": "08012345678"},
+            format="json",
+        )
+        return self.view(request, registration_link=event.registration_link)
+
+    def expect(self, name, response, expected):
+        if response.status_code != expected:
+            raise CommandError(f"{name} registration answered {response.status_code}: {response.data}")
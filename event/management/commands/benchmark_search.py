@@ -0,0 +1,101 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import time as clock, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from event.models import Event, UserProfile
+from event.search import search_events
+
+WORDS = (
+    "jazz music food fair tech meetup startup art gallery film festival book club "
+    "yoga run marathon church choir comedy night market fashion show career summit "
+    "python design product crypto football cooking wine dance salsa poetry theatre"
+).split()
+CITIES = ("Lagos", "Abuja", "Ibadan", "Port Harcourt", "Kano", "Enugu", "Accra", "Nairobi")
+SYLLABLES = "ka lo mi ne ta ru si bo de fa gu hi jo ke la ma".split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the public event search and date filters, optionally against "
+        "seeded events that are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Insert this many events first.")
+        parser.add_argument("--runs", type=int, default=5, help="Timed runs per query.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["seed"]:
+                started = time.perf_counter()
+                self.seed(options["seed"])
+                self.stdout.write(f"seeded {options['seed']} events in {time.perf_counter() - started:.1f}s")
+
+            today = timezone.localdate()
+            events = Event.objects.with_list_stats()
+            queries = [
+                ("search 'jazz'", lambda: search_events(events, "jazz").order_by("-search_rank", "id")[:50]),
+                ("search 'lagos food fair'", lambda: search_events(events, "lagos food fair").order_by("-search_rank", "id")[:50]),
+                ("search prefix 'mara'", lambda: search_events(events, "mara").order_by("-search_rank", "id")[:50]),
+                (
+                    "search 'music', upcoming",
+                    lambda: search_events(events.filter(date__gte=today), "music").order_by("-search_rank", "id")[:50],
+                ),
+                (
+                    "next 30 days",
+                    lambda: events.filter(date__gte=today, date__lte=today + timedelta(days=30)).order_by("date", "time", "id")[:50],
+                ),
+            ]
+            for name, make in queries:
+                timings = []
+                for _ in range(options["runs"]):
+                    started = time.perf_counter()
+                    rows = len(list(make()))
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"{name}: {rows} rows, median {statistics.median(timings) * 1000:.1f} ms, "
+                    f"max {max(timings) * 1000:.1f} ms"
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        rng = random.Random(0)
+        # Filler vocabulary, so that each of WORDS matches a realistic share of events.
+        filler = ["".join(rng.choices(SYLLABLES, k=3)) for _ in range(5000)]
+        prefix = uuid.uuid4().hex[:8]
+        creators = User.objects.bulk_create(
+            (User(username=f"search-bench-{prefix}-{n}") for n in range(max(count // 100, 1))),
+            batch_size=1000,
+        )
+        UserProfile.objects.bulk_create(
+            (UserProfile(user=user, phone_number="") for user in creators), batch_size=1000
+        )
+        today = timezone.localdate()
+        batch = []
+        for n in range(count):
+            event_id = uuid.uuid4()
+            batch.append(
+                Event(
+                    id=event_id,
+                    creator=creators[n % len(creators)],
+                    title=" ".join([rng.choice(WORDS), *rng.choices(filler, k=2)]).title(),
+                    description=" ".join([*rng.choices(WORDS, k=2), *rng.choices(filler, k=30)]),
+                    location=rng.choice(CITIES),
+                    date=today + timedelta(days=rng.randrange(-365, 365)),
+                    time=clock(rng.randrange(24)),
+                    registration_link=f"{event_id}-bench",
+                )
+            )
+            if len(batch) == 5000:
+                Event.objects.bulk_create(batch)
+                batch = []
+        Event.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,54 @@
+import asyncio
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from event.accounts import create_account, hash_password, hash_workers
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure signups per second through create_account, and how many "
+        "passwords per second the async signup view can hash on its pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100, help="Signups to time (rolled back afterwards).")
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        prefix = uuid.uuid4().hex[:8]
+
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for n in range(count):
+                    name = f"bench-{prefix}-{n}"
+                    create_account(name, f"{name}@example.com", "08012345678", password="bench-password")
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"signups: {count / elapsed:.1f}/s, {len(queries) / count:.1f} queries per signup"
+        )
+
+        started = time.perf_counter()
+        for _ in range(count):
+            make_password("bench-password")
+        inline = count / (time.perf_counter() - started)
+
+        async def hash_all():
+            await asyncio.gather(*(hash_password("bench-password") for _ in range(count)))
+
+        started = time.perf_counter()
+        asyncio.run(hash_all())
+        pooled = count / (time.perf_counter() - started)
+
+        self.stdout.write(
+            f"password hashing: {inline:.1f}/s inline, {pooled:.1f}/s on "
+            f"{hash_workers} pool threads"
+        )
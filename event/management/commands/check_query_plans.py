@@ -0,0 +1,158 @@
+import re
+import uuid
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from event.models import Attendee, EmailOutbox, Event, ScheduledReminder, UserProfile
+from event.search import search_events
+from event.tasks import pending_reminder_attendees
+
+# "SCAN <table>" without an index is a full table scan in SQLite's plans.
+# Virtual tables (the FTS5 search index) report their own index use.
+SQLITE_FULL_SCAN = re.compile(r"\bSCAN (?!CONSTANT)(\w+)(?! USING| VIRTUAL TABLE)(?:\s|$)")
+POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the hot queries of the API and the reminder tasks, and "
+        "fail if any of them falls back to a full table scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Insert this many events (with attendees) before explaining. "
+            "The seeded rows are rolled back afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options["seed"]:
+                self.seed(options["seed"])
+            failures = []
+            for name, queryset in self.hot_queries():
+                plan = queryset.explain()
+                scans = full_scans(plan)
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"== {name}\n{plan}\n")
+                if scans:
+                    failures.append(f"{name}: full scan of {', '.join(scans)}")
+                else:
+                    self.stdout.write(f"{name}: ok")
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError("\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index."))
+
+    def hot_queries(self):
+        """The queries the views and tasks run most, with representative values."""
+        event = Event.objects.order_by().first()
+        event_id = event.id if event else uuid.uuid4()
+        creator_id = event.creator_id if event else 0
+        today = timezone.localdate()
+        noon = time(12)
+
+        return [
+            ("public events, first page", Event.objects.with_list_stats().order_by("date", "time", "id")[:51]),
+            (
+                "public events, next page",
+                Event.objects.with_list_stats()
+                .filter(Q(date__gte=today) & (Q(date__gt=today) | Q(date=today, time__gt=noon)))
+                .order_by("date", "time", "id")[:51],
+            ),
+            (
+                "public events by popularity",
+                Event.objects.with_list_stats().order_by("-attendee_count", "id")[:51],
+            ),
+            (
+                "upcoming events in a date range",
+                Event.objects.with_list_stats()
+                .filter(date__gte=today, date__lte=today + timedelta(days=30))
+                .order_by("date", "time", "id")[:51],
+            ),
+            (
+                "event search",
+                search_events(Event.objects.with_list_stats(), "music").order_by("-search_rank", "id")[:51],
+            ),
+            (
+                "creator events",
+                Event.objects.filter(creator_id=creator_id).with_list_stats().order_by("date", "time", "id")[:51],
+            ),
+            ("registration link", Event.objects.filter(registration_link=f"{event_id}-code")),
+            ("event attendees", Attendee.objects.filter(event_id=event_id).order_by("registered_at", "id")[:51]),
+            (
+                "due reminders",
+                ScheduledReminder.objects.filter(dispatched_at__isnull=True, due_at__lte=timezone.now()).order_by("due_at"),
+            ),
+            (
+                "reminder recipients",
+                pending_reminder_attendees(1)
+                .filter(event_id=event_id, pk__gt=uuid.UUID(int=0))
+                .order_by("id")
+                .values_list("id", flat=True)[499:500],
+            ),
+            ("caller by phone", Attendee.objects.filter(phone_e164="+2348000000000").order_by("-registered_at")[:1]),
+            (
+                "email outbox",
+                EmailOutbox.objects.filter(sent_at__isnull=True, available_at__lte=timezone.now(), attempts__lt=5)
+                .order_by("available_at")[:100],
+            ),
+        ]
+
+    def seed(self, count):
+        prefix = uuid.uuid4().hex[:8]
+        creators = User.objects.bulk_create(
+            (User(username=f"plan-check-{prefix}-{n}") for n in range(max(count // 10, 1))),
+            batch_size=1000,
+        )
+        UserProfile.objects.bulk_create(
+            (UserProfile(user=user, phone_number="") for user in creators), batch_size=1000
+        )
+        today = timezone.localdate()
+        events = []
+        for n in range(count):
+            event_id = uuid.uuid4()
+            events.append(
+                Event(
+                    id=event_id,
+                    creator=creators[n % len(creators)],
+                    title=f"Event {n}",
+                    description="Seeded by check_query_plans",
+                    location="Nowhere",
+                    date=today + timedelta(days=n % 365),
+                    time=time(n % 24),
+                    registration_link=f"{event_id}-seed",
+                )
+            )
+        Event.objects.bulk_create(events, batch_size=1000)
+        Attendee.objects.bulk_create(
+            (
+                Attendee(
+                    event=event,
+                    name=f"Attendee {k}",
+                    email=f"{k}@example.com",
+                    phone_number=f"+23480{n:08d}",
+                    phone_e164=f"+23480{n:08d}",
+                )
+                for n, event in enumerate(events)
+                for k in range(5)
+            ),
+            batch_size=1000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+def full_scans(plan):
+    """Return the tables that ``plan`` reads with a full scan."""
+    pattern = POSTGRES_FULL_SCAN if connection.vendor == "postgresql" else SQLITE_FULL_SCAN
+    return sorted(set(pattern.findall(plan)))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from event.search import install_search_index, remove_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the full-text search index of events. On SQLite, migrate does "
+        "this itself when a table rebuild has dropped the index triggers or "
+        "renumbered the rowids the index is keyed on. VACUUM can renumber them "
+        "too, so vacuum with --vacuum, which rebuilds the index afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite database first.")
+
+    def handle(self, *args, **options):
+        if options["vacuum"]:
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute("VACUUM")
+            else:
+                self.stdout.write("--vacuum only applies to SQLite; skipped.")
+        with connection.schema_editor() as schema_editor:
+            if connection.vendor == "sqlite":
+                remove_search_index(schema_editor)
+            install_search_index(schema_editor)
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
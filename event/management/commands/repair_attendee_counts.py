@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from event.models import Attendee, Event
+
+
+class Command(BaseCommand):
+    help = "Recompute Event.attendee_count from the attendee rows and fix any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of drifted events fixed per UPDATE.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the events whose count has drifted.",
+        )
+
+    def handle(self, *args, **options):
+        attendees = (
+            Attendee.objects.filter(event=OuterRef("pk"))
+            .order_by()
+            .values("event")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        drifted = (
+            Event.objects.annotate(actual=Coalesce(Subquery(attendees), 0))
+            .exclude(attendee_count=F("actual"))
+            .values_list("pk", flat=True)
+        )
+
+        # Read the ids before writing so the scan is not affected by the fixes.
+        event_ids = list(drifted)
+        if not options["dry_run"]:
+            size = options["batch_size"]
+            for start in range(0, len(event_ids), size):
+                Event.objects.filter(pk__in=event_ids[start:start + size]).recount_attendees()
+
+        verb = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {len(event_ids)} event(s) with a drifted attendee count.")
+        )
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:32
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_phone_number(raw):
+    """A copy of ``event.phone.normalize_phone_number`` as it was when this migration was written.
+
+    Migrations must not import app code, which may change or go away later.
+    """
+    if not raw:
+        return ""
+    raw = raw.strip()
+    digits = re.sub(r"\D", "", raw)
+
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = getattr(settings, "PHONE_DEFAULT_COUNTRY_CODE", "234") + digits[1:]
+
+    if not 8 <= len(digits) <= 15:
+        return ""
+    return f"+{digits}"
+
+
+def backfill_phone_e164(apps, schema_editor):
+    for model_name in ("Attendee", "UserProfile"):
+        model = apps.get_model("event", model_name)
+        batch = []
+        for row in model.objects.only("pk", "phone_number").iterator(chunk_size=2000):
+            row.phone_e164 = normalize_phone_number(row.phone_number)
+            batch.append(row)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ["phone_e164"])
+                batch = []
+        model.objects.bulk_update(batch, ["phone_e164"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0008_inboundmessage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendee',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(fields=['phone_e164', '-registered_at'], name='event_attendee_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['phone_e164'], name='event_profile_phone_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:48
+
+import django.core.validators
+import event.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0012_attendee_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='flyer_staged',
+            field=models.FileField(blank=True, editable=False, storage=event.models.flyer_staging_storage, upload_to='flyers/'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='flyer_status',
+            field=models.CharField(choices=[('READY', 'Ready'), ('PENDING', 'Pending'), ('FAILED', 'Failed')], default='READY', editable=False, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='flyer',
+            field=models.ImageField(blank=True, null=True, storage=event.models.flyer_storage, upload_to='images/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'png', 'jpeg'])]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0013_flyer_staging'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='flyer_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+
+class RunSQLOn(migrations.RunSQL):
+    """``RunSQL`` that only runs on one database vendor."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, [self.vendor, *args], kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS event_event_fts USING fts5(
+        title, description, location,
+        content='event_event', content_rowid='rowid', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_event_fts_insert AFTER INSERT ON event_event BEGIN
+        INSERT INTO event_event_fts(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_event_fts_update
+    AFTER UPDATE OF title, description, location ON event_event BEGIN
+        INSERT INTO event_event_fts(event_event_fts, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+        INSERT INTO event_event_fts(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_event_fts_delete AFTER DELETE ON event_event BEGIN
+        INSERT INTO event_event_fts(event_event_fts, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+    END
+    """,
+    "INSERT INTO event_event_fts(event_event_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS event_event_fts_insert",
+    "DROP TRIGGER IF EXISTS event_event_fts_update",
+    "DROP TRIGGER IF EXISTS event_event_fts_delete",
+    "DROP TABLE IF EXISTS event_event_fts",
+]
+
+POSTGRES_SCHEMA = [
+    """
+    ALTER TABLE event_event ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS event_event_search_idx ON event_event USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS event_event_search_idx",
+    "ALTER TABLE event_event DROP COLUMN IF EXISTS search_vector",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0014_flyer_variants'),
+    ]
+
+    operations = [
+        RunSQLOn('sqlite', SQLITE_SCHEMA, SQLITE_DROP),
+        RunSQLOn('postgresql', POSTGRES_SCHEMA, POSTGRES_DROP),
+    ]
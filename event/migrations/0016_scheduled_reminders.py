@@ -0,0 +1,78 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:00
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_upcoming_events(apps, schema_editor):
+    Event = apps.get_model("event", "Event")
+    ScheduledReminder = apps.get_model("event", "ScheduledReminder")
+    offsets = getattr(
+        settings, "REMINDER_OFFSETS", [datetime.timedelta(hours=24), datetime.timedelta(hours=1)]
+    )
+    now = timezone.now()
+    zone = timezone.get_default_timezone()
+    upcoming = Event.objects.filter(date__gte=timezone.localdate() - datetime.timedelta(days=1))
+
+    batch = []
+    for event_id, date, time in upcoming.values_list("id", "date", "time").iterator(chunk_size=1000):
+        starts_at = timezone.make_aware(datetime.datetime.combine(date, time), zone)
+        batch.extend(
+            ScheduledReminder(event_id=event_id, offset=offset, due_at=starts_at - offset)
+            for offset in offsets
+            if starts_at - offset > now
+        )
+        if len(batch) >= 1000:
+            ScheduledReminder.objects.bulk_create(batch)
+            batch = []
+    ScheduledReminder.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0015_event_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.DurationField()),
+                ('due_at', models.DateTimeField()),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='reminder',
+            name='event_reminder_sent_idx',
+        ),
+        migrations.AddField(
+            model_name='scheduledreminder',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_schedules', to='event.event'),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reminders', to='event.scheduledreminder'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['schedule', 'attendee'], name='event_reminder_schedule_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledreminder',
+            index=models.Index(condition=models.Q(('dispatched_at__isnull', True)), fields=['due_at'], name='event_schedule_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledreminder',
+            constraint=models.UniqueConstraint(fields=('event', 'offset'), name='event_schedule_unique_offset'),
+        ),
+        migrations.RunPython(schedule_upcoming_events, migrations.RunPython.noop),
+    ]
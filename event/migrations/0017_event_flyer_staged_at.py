@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+def backfill_staged_at(apps, schema_editor):
+    Event = apps.get_model("event", "Event")
+    Event.objects.exclude(flyer_staged="").update(flyer_staged_at=models.F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0016_scheduled_reminders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='flyer_staged_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_staged_at, migrations.RunPython.noop),
+    ]
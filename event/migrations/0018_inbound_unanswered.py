@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0017_event_flyer_staged_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inboundmessage',
+            index=models.Index(condition=models.Q(('answered_at__isnull', True)), fields=['received_at'], name='event_inbound_unanswered_idx'),
+        ),
+    ]
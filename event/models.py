@@ -1,35 +1,145 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.crypto import get_random_string
 from django.utils import timezone
+import datetime
 import uuid
 from django.core.validators import FileExtensionValidator
-from cloudinary_storage.storage import MediaCloudinaryStorage
+from django.core.files.storage import FileSystemStorage
 from django.conf import settings
+from django.utils.module_loading import import_string
 import os
-from django.db.models.signals import post_save
+import logging
+from collections import Counter
+from django.db.models.signals import post_delete, post_save
+from django.db.models.functions import Coalesce, Greatest
 from django.dispatch import receiver
+from .cache import public_events_cache
+from .phone import normalize_phone_number
+
+logger = logging.getLogger(__name__)
 
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     phone_number = models.CharField(max_length=20)
+    phone_e164 = models.CharField(max_length=16, blank=True, editable=False)
     confirm_password = models.CharField(max_length=154, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["phone_e164"], name="event_profile_phone_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone_number(self.phone_number)
+        kwargs["update_fields"] = with_normalized_phone(kwargs.get("update_fields"))
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username}'s profile"
 
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
+def with_normalized_phone(update_fields):
+    """Save ``phone_e164`` whenever ``phone_number`` is in ``update_fields``."""
+    if update_fields is None or "phone_number" not in update_fields:
+        return update_fields
+    return {*update_fields, "phone_e164"}
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """Give every new user a profile, with the phone number given at signup if any.
+
+    Later saves of the user leave the profile alone; it is saved on its own
+    when it changes.
+    """
+    if created and not raw:
+        UserProfile.objects.create(
+            user=instance, phone_number=getattr(instance, "_pending_phone_number", "")
+        )
+
+
+DEFAULT_REMINDER_OFFSETS = [datetime.timedelta(hours=24), datetime.timedelta(hours=1)]
+
+
+def reminder_offsets():
+    """How long before an event starts its reminders go out, ``REMINDER_OFFSETS``."""
+    return getattr(settings, "REMINDER_OFFSETS", DEFAULT_REMINDER_OFFSETS)
+
+
+def flyer_storage():
+    """The storage flyers are served from, ``FLYER_STORAGE`` (Cloudinary by default)."""
+    return import_string(settings.FLYER_STORAGE)()
+
+
+def flyer_staging_storage():
+    """Local storage that holds deferred flyer uploads until they are transferred."""
+    return FileSystemStorage(location=settings.FLYER_STAGING_ROOT)
+
+
+class EventQuerySet(models.QuerySet):
+    def with_list_stats(self):
+        """Annotate the per-row values the event serializers would otherwise query for.
+
+        The attendee count is stored on the row (``attendee_count``), so only
+        the creator's details need annotating and no join with GROUP BY is
+        needed.
+        """
+        return self.annotate(
+            creator_username=models.F("creator__username"),
+            creator_phone=models.F("creator__profile__phone_number"),
+        )
+
+    def release_attendees(self, attendees):
+        """Take deleted attendees off the counts; ``attendees`` are ``(event_id, status)`` pairs.
+
+        Confirmed attendees also give their seat back. Decrements by the rows
+        deleted rather than recounting, so a registration committed at the
+        same time is not counted away.
+        """
+        attendees = list(attendees)
+        deleted = Counter(event_id for event_id, _ in attendees)
+        confirmed = Counter(event_id for event_id, status in attendees if status == "CONFIRMED")
+        for event_id, count in deleted.items():
+            self.filter(pk=event_id).update(
+                attendee_count=Greatest(models.F("attendee_count") - count, 0),
+                seats_taken=Greatest(models.F("seats_taken") - confirmed[event_id], 0),
+                updated_at=timezone.now(),
+            )
+
+    def recount_attendees(self):
+        """Set ``attendee_count`` of the selected events from their attendee rows."""
+        attendees = (
+            Attendee.objects.filter(event=models.OuterRef("pk"))
+            .order_by()
+            .values("event")
+            .annotate(total=models.Count("pk"))
+            .values("total")
+        )
+        return self.update(attendee_count=Coalesce(models.Subquery(attendees), 0), updated_at=timezone.now())
+
+    def claim_seat(self, event_id):
+        """Take a seat for a new registration; False when the event is full.
+
+        The seat is taken with a conditional UPDATE, so concurrent
+        registrations cannot oversell and only lock the one event row. When
+        the claim fails the row is locked and the claim retried once, so a
+        registration racing a cancellation waits for the freed seat instead of
+        being waitlisted next to it.
+        """
+        has_room = models.Q(capacity__isnull=True) | models.Q(seats_taken__lt=models.F("capacity"))
+
+        def claim():
+            return self.filter(pk=event_id).filter(has_room).update(
+                seats_taken=models.F("seats_taken") + 1, updated_at=timezone.now()
+            )
+
+        if claim():
+            return True
+        list(self.filter(pk=event_id).select_for_update().values_list("pk"))
+        return bool(claim())
 
 
 class Event(models.Model):
@@ -37,19 +147,151 @@ class Event(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name="events")
     title = models.CharField(max_length=255)
     description = models.TextField()
-    flyer=models.ImageField(upload_to='images/', blank=True,null=True ,validators=[FileExtensionValidator(allowed_extensions=['jpg', 'png', 'jpeg'])],storage=MediaCloudinaryStorage)
+    flyer=models.ImageField(upload_to='images/', blank=True,null=True ,validators=[FileExtensionValidator(allowed_extensions=['jpg', 'png', 'jpeg'])],storage=flyer_storage)
+    # A deferred upload waiting for transfer_flyer to move it into ``flyer``.
+    flyer_staged = models.FileField(upload_to='flyers/', blank=True, editable=False, storage=flyer_staging_storage)
+    flyer_status = models.CharField(
+        max_length=20,
+        choices=[("READY", "Ready"), ("PENDING", "Pending"), ("FAILED", "Failed")],
+        default="READY",
+        editable=False,
+    )
+    # When ``flyer_staged`` was uploaded; transfer_pending_flyers requeues old ones.
+    flyer_staged_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Resized WebP copies of ``flyer``, written by generate_flyer_variants.
+    flyer_variants = models.JSONField(default=dict, blank=True, editable=False)
     location = models.CharField(max_length=255)
     date = models.DateField()
     time = models.TimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     registration_link = models.CharField(max_length=255, unique=True, blank=True)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by the Attendee signals and AttendeeQuerySet.bulk_create.
+    attendee_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset ordering of the public list; also the reminder date range.
+            models.Index(fields=["date", "time", "id"], name="event_event_schedule_idx"),
+            # A creator's events in keyset order.
+            models.Index(fields=["creator", "date", "time", "id"], name="event_event_creator_idx"),
+            # Ordering by popularity, publicly and per creator.
+            models.Index(fields=["-attendee_count", "id"], name="event_event_popular_idx"),
+            models.Index(fields=["creator", "-attendee_count", "id"], name="event_event_creator_pop_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.registration_link:
             self.registration_link = f"{self.id}-{get_random_string(8)}"
         super().save(*args, **kwargs)
 
+    def sync_seats(self):
+        """Recount the confirmed seats and fill free ones from the waitlist.
+
+        Needed when the capacity of an event changes after people registered.
+        """
+        with transaction.atomic():
+            event = Event.objects.select_for_update().get(pk=self.pk)
+            confirmed = event.attendees.filter(status="CONFIRMED").count()
+            waiting = event.attendees.filter(status="WAITLISTED").order_by("registered_at", "id")
+            if event.capacity is not None:
+                waiting = waiting[: max(event.capacity - confirmed, 0)]
+            promoted = Attendee.objects.filter(
+                pk__in=list(waiting.values_list("pk", flat=True))
+            ).update(status="CONFIRMED")
+            Event.objects.filter(pk=self.pk).update(seats_taken=confirmed + promoted, updated_at=timezone.now())
+            return promoted
+
+    def stage_flyer(self, upload):
+        """Keep ``upload`` in staging storage and transfer it to ``flyer`` in the background.
+
+        Writing to local disk is quick, so the request does not wait for the
+        remote storage. ``flyer`` keeps its previous file until the transfer is done.
+        A pending upload this one replaces is deleted once the change is committed.
+        """
+        previous = self.flyer_staged.name
+        self.flyer_staged.save(upload.name, upload, save=False)
+        self.flyer_status = "PENDING"
+        self.flyer_staged_at = timezone.now()
+        self.save(update_fields=["flyer_staged", "flyer_status", "flyer_staged_at", "updated_at"])
+        if previous:
+            storage = self.flyer_staged.storage
+            transaction.on_commit(lambda: storage.delete(previous))
+        transaction.on_commit(lambda: enqueue_flyer_task("transfer_flyer", self.pk))
+
+    def flyer_changed(self):
+        """Drop the derivatives of the old flyer and render new ones in the background."""
+        self.flyer_variants = {}
+        Event.objects.filter(pk=self.pk).update(flyer_variants={})
+        if self.flyer:
+            transaction.on_commit(lambda: enqueue_flyer_task("generate_flyer_variants", self.pk))
+
+    def publish_flyer(self):
+        """Upload the staged flyer to the flyer storage and swap it in.
+
+        Returns False when there is nothing staged or a newer upload replaced
+        this one while it was being transferred.
+        """
+        staged = self.flyer_staged.name
+        if not staged:
+            return False
+
+        field = self._meta.get_field("flyer")
+        with self.flyer_staged.open("rb") as upload:
+            name = field.storage.save(
+                field.generate_filename(self, os.path.basename(staged)), upload
+            )
+
+        published = Event.objects.filter(pk=self.pk, flyer_staged=staged).update(
+            flyer=name,
+            flyer_staged="",
+            flyer_staged_at=None,
+            flyer_status="READY",
+            flyer_variants={},
+            updated_at=timezone.now(),
+        )
+        if not published:
+            field.storage.delete(name)
+            return False
+
+        self.flyer_staged.storage.delete(staged)
+        transaction.on_commit(public_events_cache.invalidate)
+        transaction.on_commit(lambda: enqueue_flyer_task("generate_flyer_variants", self.pk))
+        return True
+
+    @property
+    def starts_at(self):
+        return timezone.make_aware(
+            datetime.datetime.combine(self.date, self.time), timezone.get_default_timezone()
+        )
+
+    def schedule_reminders(self):
+        """Keep one ``ScheduledReminder`` per offset in ``REMINDER_OFFSETS`` in step with the start.
+
+        A schedule whose due time moved is replaced rather than updated, so
+        attendees already reminded for the old time are reminded again.
+        Reminders that would already be due when created are left out.
+        """
+        now = timezone.now()
+        due_times = {offset: self.starts_at - offset for offset in reminder_offsets()}
+        current = {schedule.offset: schedule for schedule in self.reminder_schedules.all()}
+        stale = [
+            schedule.pk for offset, schedule in current.items() if due_times.get(offset) != schedule.due_at
+        ]
+        fresh = [
+            ScheduledReminder(event=self, offset=offset, due_at=due_at)
+            for offset, due_at in due_times.items()
+            if due_at > now and (offset not in current or current[offset].pk in stale)
+        ]
+        if stale or fresh:
+            with transaction.atomic():
+                ScheduledReminder.objects.filter(pk__in=stale).delete()
+                ScheduledReminder.objects.bulk_create(fresh)
+
     @property
     def creator_phone_number(self):
         return self.creator.profile.phone_number
@@ -58,30 +300,286 @@ class Event(models.Model):
         return self.title
 
 
+def enqueue_flyer_task(name, event_id):
+    from . import tasks
+
+    try:
+        getattr(tasks, name).delay(str(event_id))
+    except Exception:
+        logger.warning("Could not enqueue %s for event %s", name, event_id, exc_info=True)
+
+
+class AttendeeQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert the rows and bring ``Event.attendee_count`` up to date.
+
+        ``bulk_create`` sends no signals, so the counts are adjusted here: by
+        an ``F()`` increment per event, or by an exact recount when conflicts
+        may have been skipped and the inserted rows are unknown.
+        """
+        objs = super().bulk_create(objs, *args, **kwargs)
+        added = Counter(obj.event_id for obj in objs)
+        if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+            Event.objects.filter(pk__in=added).recount_attendees()
+        else:
+            for event_id, count in added.items():
+                Event.objects.filter(pk=event_id).update(
+                    attendee_count=models.F("attendee_count") + count, updated_at=timezone.now()
+                )
+        if added:
+            transaction.on_commit(public_events_cache.invalidate)
+        return objs
+
+    def delete(self):
+        """Delete the attendees and take them off their events' counts and seats.
+
+        The rows are locked and then deleted by primary key, so the counts
+        move by exactly the rows that went, also for admin bulk deletes.
+        """
+        with transaction.atomic():
+            rows = list(self.order_by().select_for_update().values_list("pk", "event_id", "status"))
+            locked = self.model.objects.filter(pk__in=[pk for pk, _, _ in rows])
+            deleted, per_model = super(AttendeeQuerySet, locked).delete()
+            if per_model.get(self.model._meta.label):
+                Event.objects.release_attendees((event_id, status) for _, event_id, status in rows)
+                transaction.on_commit(public_events_cache.invalidate)
+        return deleted, per_model
+
+
 class Attendee(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="attendees")
     name = models.CharField(max_length=255)
     email = models.EmailField()
     phone_number = models.CharField(max_length=20)
+    phone_e164 = models.CharField(max_length=16, blank=True, editable=False)
     registered_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[("CONFIRMED", "Confirmed"), ("WAITLISTED", "Waitlisted")],
+        default="CONFIRMED",
+        editable=False,
+    )
+
+    objects = AttendeeQuerySet.as_manager()
 
     class Meta:
         unique_together = ("event", "email")
+        indexes = [
+            # Serves "latest registration for this phone" in the WhatsApp webhook.
+            models.Index(fields=["phone_e164", "-registered_at"], name="event_attendee_phone_idx"),
+            # An event's attendees in keyset order.
+            models.Index(fields=["event", "registered_at", "id"], name="event_attendee_event_idx"),
+            # Next in line on an event's waitlist.
+            models.Index(fields=["event", "status", "registered_at"], name="event_attendee_waitlist_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.phone_e164 = normalize_phone_number(self.phone_number)
+        kwargs["update_fields"] = with_normalized_phone(kwargs.get("update_fields"))
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Delete the registration and take it off ``Event.attendee_count``.
+
+        A confirmed registration also gives its seat back. The counts only
+        move when a row was really deleted, and by the status that was
+        stored, so deleting a stale copy leaves them alone.
+        """
+        with transaction.atomic():
+            stored = Attendee.objects.select_for_update().filter(pk=self.pk).values_list("status", flat=True).first()
+            deleted, per_model = super().delete(*args, **kwargs)
+            if per_model.get(Attendee._meta.label):
+                Event.objects.release_attendees([(self.event_id, stored)])
+        return deleted, per_model
+
+    def cancel(self):
+        """Delete the registration and hand its seat to the first waitlisted attendee.
+
+        Returns the promoted attendee, if any. The event row is locked for the
+        duration so the freed seat cannot be claimed twice. The registration is
+        read again under that lock, so a copy that was cancelled or promoted
+        since it was loaded is handled by what is stored, not by what it says.
+        """
+        with transaction.atomic():
+            event = Event.objects.select_for_update().only("pk", "capacity").get(pk=self.event_id)
+            stored = Attendee.objects.select_for_update().filter(pk=self.pk).values_list("status", flat=True).first()
+            if stored is None:
+                return None
+            self.status = stored
+            _, deleted = self.delete()
+            if not deleted.get(Attendee._meta.label) or self.status != "CONFIRMED" or event.capacity is None:
+                return None
+
+            promoted = (
+                Attendee.objects.filter(event_id=self.event_id, status="WAITLISTED")
+                .order_by("registered_at", "id")
+                .first()
+            )
+            if promoted is None:
+                return None
+
+            # delete() gave the seat back; the promoted attendee takes it.
+            promoted.status = "CONFIRMED"
+            promoted.save(update_fields=["status"])
+            Event.objects.filter(pk=self.event_id).update(
+                seats_taken=models.F("seats_taken") + 1, updated_at=timezone.now()
+            )
+            return promoted
 
     def __str__(self):
         return f"{self.name} - {self.event.title}"
 
 
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_public_events_for_event(sender, **kwargs):
+    transaction.on_commit(public_events_cache.invalidate)
+
+
+@receiver(post_save, sender=Event)
+def reschedule_reminders(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Saves that cannot move the start time leave the schedules alone.
+    if raw or (update_fields is not None and not {"date", "time"} & set(update_fields)):
+        return
+    instance.schedule_reminders()
+
+
+@receiver(post_save, sender=Attendee)
+def count_registration(sender, instance, created, raw=False, **kwargs):
+    # Only new registrations change the attendee count in the payload.
+    if created and not raw:
+        Event.objects.filter(pk=instance.event_id).update(
+            attendee_count=models.F("attendee_count") + 1, updated_at=timezone.now()
+        )
+        transaction.on_commit(public_events_cache.invalidate)
+
+
+@receiver(post_delete, sender=Attendee)
+def invalidate_public_events_for_attendee(sender, instance, origin=None, **kwargs):
+    # The count itself is adjusted by Attendee.delete and AttendeeQuerySet.delete;
+    # the latter, like the event's own post_delete, clears the cache once.
+    if not isinstance(origin, (Event, models.QuerySet)):
+        transaction.on_commit(public_events_cache.invalidate)
+
+
+class ScheduledReminder(models.Model):
+    """A reminder for every attendee of ``event``, due ``offset`` before it starts.
+
+    The ``send_event_reminders`` task picks up the rows that are due and not
+    dispatched yet. Deleting the event deletes its schedules, which cancels
+    its reminders; ``Event.schedule_reminders`` moves them when it changes.
+    """
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="reminder_schedules")
+    offset = models.DurationField()
+    due_at = models.DateTimeField()
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["event", "offset"], name="event_schedule_unique_offset"),
+        ]
+        indexes = [
+            # Only the pending rows are indexed, so finding due reminders
+            # does not get slower as sent ones pile up.
+            models.Index(
+                fields=["due_at"],
+                condition=models.Q(dispatched_at__isnull=True),
+                name="event_schedule_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.event.title} {self.offset} before it starts"
+
+
 class Reminder(models.Model):
     attendee = models.ForeignKey(
         Attendee, on_delete=models.CASCADE, related_name="reminders"
     )
+    # The schedule this reminder was sent for; null for reminders sent before
+    # reminders were scheduled, or whose schedule was moved since.
+    schedule = models.ForeignKey(
+        ScheduledReminder, on_delete=models.SET_NULL, null=True, blank=True, related_name="reminders"
+    )
     sent_at = models.DateTimeField(auto_now_add=True)
     message = models.TextField()
     type = models.CharField(
         max_length=20, choices=[("EMAIL", "Email"), ("WHATSAPP", "WhatsApp")],default="EMAIL"
     )
 
+    class Meta:
+        indexes = [
+            # "Already sent this reminder" anti-join of the reminder delivery.
+            models.Index(fields=["schedule", "attendee"], name="event_reminder_schedule_idx"),
+        ]
+
     def __str__(self):
         return f"Reminder to {self.attendee.name} via {self.type}"
+
+
+class EmailOutbox(models.Model):
+    """An email waiting to be sent by the ``dispatch_email_outbox`` task.
+
+    Rows are written in the same transaction as the change that triggers the
+    email, so nothing is sent for rolled back work and nothing is lost if the
+    process dies before the mail provider answers.
+    """
+
+    attendee = models.ForeignKey(
+        Attendee, on_delete=models.SET_NULL, null=True, blank=True, related_name="emails"
+    )
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sent_at", "available_at"], name="event_outbox_pending_idx"),
+        ]
+
+    @classmethod
+    def registration(cls, attendee, event):
+        """The confirmation or waitlist email for a new registration."""
+        if attendee.status == "WAITLISTED":
+            subject = f"You are on the waitlist for {event.title}"
+            message = f"{event.title} is fully booked, so you have been added to the waitlist. We will email you if a seat opens up"
+        else:
+            subject = f"You have Successfully registered for {event.title}"
+            message = f"Thank you for registering for {event.title}, We look forward to seeing you at the event"
+        return cls(attendee=attendee, recipient=attendee.email, subject=subject, body=message)
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient}"
+
+
+class InboundMessage(models.Model):
+    """A WhatsApp message received by the webhook and answered in the background.
+
+    ``message_id`` is the provider's id, so redelivered webhooks are dropped
+    by the unique constraint instead of being answered twice.
+    """
+
+    message_id = models.CharField(max_length=255, unique=True)
+    phone_number = models.CharField(max_length=20)
+    body = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    answered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Unanswered messages for answer_unanswered_messages; answered ones are left out.
+            models.Index(
+                fields=["received_at"],
+                condition=models.Q(answered_at__isnull=True),
+                name="event_inbound_unanswered_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Message {self.message_id} from {self.phone_number}"
@@ -0,0 +1,29 @@
+import re
+
+from django.conf import settings
+
+
+def normalize_phone_number(raw, default_country_code=None):
+    """Return ``raw`` in E.164 form, e.g. ``+2348012345678``.
+
+    Numbers written with ``+`` or ``00`` keep their country code, numbers with
+    a leading trunk ``0`` get ``PHONE_DEFAULT_COUNTRY_CODE``, and bare digits
+    are taken to already include the country code, which is how the WhatsApp
+    API reports senders. Returns ``""`` for values that cannot be a number.
+    """
+    if not raw:
+        return ""
+    raw = raw.strip()
+    digits = re.sub(r"\D", "", raw)
+
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        country_code = default_country_code or settings.PHONE_DEFAULT_COUNTRY_CODE
+        digits = country_code + digits[1:]
+
+    if not 8 <= len(digits) <= 15:
+        return ""
+    return f"+{digits}"
@@ -0,0 +1,217 @@
+"""Full-text search over event titles, descriptions and locations.
+
+SQLite keeps an FTS5 index (``event_event_fts``) in step with ``event_event``
+through triggers; Postgres keeps a generated ``search_vector`` column with a
+GIN index. Both are created by migration 0015 and can be rebuilt with the
+``rebuild_search_index`` command.
+
+The FTS5 index is keyed on the implicit rowid of ``event_event``, whose
+primary key is a UUID. SQLite may renumber such rowids when it rebuilds the
+table, during a migration or a ``VACUUM``, and the index then points at the
+wrong events. ``repair_search_index`` checks for that, and for the triggers a
+table rebuild drops, after every ``migrate``. Vacuum with
+``rebuild_search_index --vacuum`` rather than a bare ``VACUUM``.
+"""
+import datetime
+import re
+
+from django.db import DatabaseError, connection, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS event_event_fts USING fts5(
+        title, description, location,
+        content='event_event', content_rowid='rowid', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_event_fts_insert AFTER INSERT ON event_event BEGIN
+        INSERT INTO event_event_fts(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_event_fts_update
+    AFTER UPDATE OF title, description, location ON event_event BEGIN
+        INSERT INTO event_event_fts(event_event_fts, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+        INSERT INTO event_event_fts(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_event_fts_delete AFTER DELETE ON event_event BEGIN
+        INSERT INTO event_event_fts(event_event_fts, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+    END
+    """,
+    "INSERT INTO event_event_fts(event_event_fts) VALUES ('rebuild')",
+]
+
+SQLITE_OBJECTS = (
+    "event_event_fts",
+    "event_event_fts_insert",
+    "event_event_fts_update",
+    "event_event_fts_delete",
+)
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS event_event_fts_insert",
+    "DROP TRIGGER IF EXISTS event_event_fts_update",
+    "DROP TRIGGER IF EXISTS event_event_fts_delete",
+    "DROP TABLE IF EXISTS event_event_fts",
+]
+
+# Title matches weigh most, then the location, then the description.
+POSTGRES_SCHEMA = [
+    """
+    ALTER TABLE event_event ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS event_event_search_idx ON event_event USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS event_event_search_idx",
+    "ALTER TABLE event_event DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def install_search_index(schema_editor):
+    statements = {"sqlite": SQLITE_SCHEMA, "postgresql": POSTGRES_SCHEMA}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def remove_search_index(schema_editor):
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def missing_search_objects(connection):
+    """The parts of the SQLite search index that are not in the database."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(SQLITE_OBJECTS))})",
+            SQLITE_OBJECTS,
+        )
+        present = {name for (name,) in cursor.fetchall()}
+    return [name for name in SQLITE_OBJECTS if name not in present]
+
+
+def search_index_out_of_step(connection):
+    """Whether the SQLite search index disagrees with ``event_event``, e.g. after renumbered rowids.
+
+    Runs FTS5's ``integrity-check`` against the table, which reads all of it.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO event_event_fts(event_event_fts, rank) VALUES ('integrity-check', 1)")
+    except DatabaseError:
+        return True
+    return False
+
+
+def repair_search_index(sender, using, **kwargs):
+    """``post_migrate``: recreate the SQLite search index when it no longer matches ``event_event``.
+
+    That is when a table rebuild dropped its triggers or renumbered the rowids
+    the index is keyed on. The index is rebuilt from the table rather than
+    only re-triggered.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ("event", "0015_event_search") not in applied:
+        return
+    if not missing_search_objects(connection) and not search_index_out_of_step(connection):
+        return
+    with connection.schema_editor() as schema_editor:
+        remove_search_index(schema_editor)
+        install_search_index(schema_editor)
+
+
+def fts5_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix."""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_events(queryset, text):
+    """Filter ``queryset`` to the events matching ``text``, annotated with ``search_rank``.
+
+    Higher ranks are better matches.
+    """
+    if connection.vendor == "postgresql":
+        query = "websearch_to_tsquery('english', %s)"
+        return queryset.extra(
+            where=[f"event_event.search_vector @@ {query}"], params=[text]
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd(event_event.search_vector, {query})", [text], output_field=FloatField()
+            )
+        )
+
+    match = fts5_query(text)
+    if match is None:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.extra(
+        tables=["event_event_fts"],
+        where=["event_event_fts.rowid = event_event.rowid", "event_event_fts MATCH %s"],
+        params=[match],
+    ).annotate(
+        # bm25() is lower for better matches; the weights follow the columns.
+        search_rank=RawSQL("-bm25(event_event_fts, 10.0, 1.0, 5.0)", [], output_field=FloatField())
+    )
+
+
+class EventSearchFilter(BaseFilterBackend):
+    """``?q=`` full-text search plus ``date_from``, ``date_to`` and ``upcoming`` filters.
+
+    Searches are ordered by relevance unless another ``ordering`` is asked for.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        date_from = parse_date(params, "date_from")
+        date_to = parse_date(params, "date_to")
+        if params.get("upcoming", "").lower() in ("1", "true", "yes"):
+            today = timezone.localdate()
+            date_from = max(date_from, today) if date_from else today
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+
+        text = params.get("q", "").strip()
+        if text:
+            queryset = search_events(queryset, text)
+            if params.get("ordering", "relevance") == "relevance":
+                view.keyset_ordering = ("-search_rank", "id")
+        return queryset
+
+
+def parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: ["Use the YYYY-MM-DD format."]})
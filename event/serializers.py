@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from .accounts import create_account
 from .models import UserProfile, Event, Attendee, Reminder
 
 
@@ -53,67 +57,104 @@ class UserSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"confirm_password": "Passwords do not match."}
             )
-        return data
-
-    def create(self, validated_data):
-        """Create a new user and associate a profile."""
-        email = validated_data.get("email")
-        username = validated_data.get("username")
-        phone_number = validated_data.pop("phone_number", None)
-        validated_data.pop("confirm_password", None)
 
         # Check for required fields
-        if not email or not username or not phone_number:
+        if not data.get("email") or not data.get("username") or not data.get("phone_number"):
             raise serializers.ValidationError(
                 {"info": "Email, username, and phone number are required."}
             )
 
         # Check if email already exists
-        if User.objects.filter(email=email).exists():
+        if User.objects.filter(email=data["email"]).exists():
             raise serializers.ValidationError(
                 {"info": "A user with this email already exists."}
             )
+        return data
 
-        # Create user
-        user = User.objects.create_user(
-            username=username, email=email, password=validated_data.get("password")
+    def create(self, validated_data):
+        """Create the user with its profile and token; see ``create_account``."""
+        user, token = create_account(
+            validated_data["username"],
+            validated_data["email"],
+            validated_data["phone_number"],
+            password=validated_data["password"],
         )
-
-        user.save()
-        # Save phone number to user profile
-        user.profile.phone_number = phone_number
-        user.profile.save()
         return user
 
 
 class EventSerializer(serializers.ModelSerializer):
 
     registration_link = serializers.ReadOnlyField()
-    attendee_count = serializers.SerializerMethodField()
+    attendee_count = serializers.ReadOnlyField()
     creator_phone = serializers.SerializerMethodField()
-    creator = serializers.ReadOnlyField(source='creator.username')
+    creator = serializers.SerializerMethodField()
+    flyer_variants = serializers.SerializerMethodField()
 
 
     class Meta:
         model = Event
         fields = ['id', 'title','flyer','creator', 'description', 'location','time', 'date', 
-                  'created_at', 'registration_link', 'attendee_count', 'creator_phone']
+                  'created_at', 'registration_link', 'attendee_count', 'creator_phone',
+                  'capacity', 'seats_taken', 'flyer_status', 'flyer_variants']
+
+    def get_creator(self, obj):
+        if hasattr(obj, "creator_username"):
+            return obj.creator_username
+        return obj.creator.username
 
-    def get_attendee_count(self, obj):
-        return obj.attendees.count()
-        
     def get_creator_phone(self, obj):
         """Get the phone number of the event creator."""
+        if hasattr(obj, "creator_phone"):
+            return obj.creator_phone
         try:
             return obj.creator.profile.phone_number
         except ObjectDoesNotExist:
             return None
    
 
+    def get_flyer_variants(self, obj):
+        """URLs of the resized copies of the flyer, once they are generated."""
+        storage = obj._meta.get_field("flyer").storage
+        request = self.context.get("request")
+        urls = {}
+        for variant, name in obj.flyer_variants.get("files", {}).items():
+            url = storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
+
     def create(self, validated_data):
         """Associate the event with the creator."""
         validated_data["creator"] = self.context["request"].user
-        return super().create(validated_data)
+        flyer = self.pop_deferred_flyer(validated_data)
+        instance = super().create(validated_data)
+        if flyer:
+            instance.stage_flyer(flyer)
+        elif validated_data.get("flyer"):
+            instance.flyer_changed()
+        return instance
+
+    def update(self, instance, validated_data):
+        """Rebalance seats and waitlist when the capacity changes."""
+        capacity_changed = (
+            "capacity" in validated_data and validated_data["capacity"] != instance.capacity
+        )
+        flyer = self.pop_deferred_flyer(validated_data)
+        instance = super().update(instance, validated_data)
+        if flyer:
+            instance.stage_flyer(flyer)
+        elif "flyer" in validated_data:
+            instance.flyer_changed()
+        if capacity_changed:
+            instance.sync_seats()
+            instance.refresh_from_db(fields=["seats_taken"])
+        return instance
+
+
+    def pop_deferred_flyer(self, validated_data):
+        """Take a new flyer out of ``validated_data`` when uploads are deferred."""
+        if settings.DEFERRED_FLYER_UPLOADS and validated_data.get("flyer"):
+            return validated_data.pop("flyer")
+        return None
 
 
 class EventDetailSerializer(EventSerializer):
@@ -126,21 +167,40 @@ class EventDetailSerializer(EventSerializer):
 class AttendeeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attendee
-        fields = ["id", "name", "email", "phone_number", "registered_at"]
+        fields = ["id", "name", "email", "phone_number", "registered_at", "status"]
 
-    def create(self, validated_data):
-        """Associate an attendee with an event."""
-        event_id = self.context.get("event_id")
-        if not event_id:
-            raise serializers.ValidationError({"event_id": "Event ID is required."})
+    duplicate_message = "The fields event, email must make a unique set."
 
+    def create(self, validated_data):
+        """Associate an attendee with an event.
+
+        Callers that already hold the event pass it to ``save(event=...)``;
+        otherwise it is loaded from ``event_id`` in the context. A duplicate
+        registration is detected from the unique constraint on insert rather
+        than with a SELECT beforehand. Events with a capacity hand out seats
+        with ``Event.objects.claim_seat`` and waitlist everyone once full.
+        """
+        if "event" not in validated_data:
+            event_id = self.context.get("event_id")
+            if not event_id:
+                raise serializers.ValidationError({"event_id": "Event ID is required."})
+
+            try:
+                validated_data["event"] = Event.objects.get(id=event_id)
+            except Event.DoesNotExist:
+                raise serializers.ValidationError({"event_id": "Event not found."})
+
+        event = validated_data["event"]
         try:
-            event = Event.objects.get(id=event_id)
-        except Event.DoesNotExist:
-            raise serializers.ValidationError({"event_id": "Event not found."})
-
-        validated_data["event"] = event
-        return super().create(validated_data)
+            with transaction.atomic():
+                # The seat claim is rolled back with the insert on a duplicate.
+                if event.capacity is not None and not Event.objects.claim_seat(event.pk):
+                    validated_data["status"] = "WAITLISTED"
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [self.duplicate_message]}
+            )
 
 
 class ReminderSerializer(serializers.ModelSerializer):
@@ -1,82 +1,374 @@
-import os
-from .utils import send_whatsapp_message
-from django.core.mail import send_mail
+import logging
+from datetime import timedelta
+
+from .utils import answer_cache, answer_inbound_message, send_whatsapp_messages
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
 from django.utils import timezone
 from django.conf import settings
-from datetime import timedelta
-from celery import shared_task
-from .models import Event,  Reminder
+from celery import chord, shared_task
+from PIL import Image, UnidentifiedImageError
+from .cache import public_events_cache
+from .images import build_flyer_variants
+from .mail import BatchMailer
+from .models import Attendee, EmailOutbox, Event, InboundMessage, Reminder, ScheduledReminder
+
+logger = logging.getLogger(__name__)
+
 
 @shared_task
 def send_event_reminders():
-  
-
-    tomorrow = timezone.now() + timedelta(days=1)
-    four_days = timezone.now() + timedelta(days=4)
-    
-    # Get events in the next 3 days
-    upcoming_events = Event.objects.filter(
-        date__gte=tomorrow,
-        date__lte=four_days
+    """Fan the reminders that have come due out to the workers.
+
+    Due schedules are read from the partial ``due_at`` index of
+    ``ScheduledReminder``, so a run with nothing due costs one index probe
+    however many events exist. Each schedule is claimed with a conditional
+    UPDATE, so overlapping runs never dispatch it twice. The attendees that
+    still need it are split into keyset ranges of ``REMINDER_CHUNK_SIZE``,
+    each delivered by its own ``deliver_reminder_chunk`` task, and
+    ``summarize_reminder_run`` collects the counts. Only the range bounds are
+    read here, so memory does not grow with the number of attendees.
+    """
+    now = timezone.now()
+    chunk_size = getattr(settings, "REMINDER_CHUNK_SIZE", 500)
+
+    due = ScheduledReminder.objects.filter(dispatched_at__isnull=True, due_at__lte=now).order_by("due_at")
+    claimed = []
+    jobs = []
+    for schedule in due.only("id", "event_id", "offset", "due_at"):
+        if not ScheduledReminder.objects.filter(pk=schedule.pk, dispatched_at__isnull=True).update(dispatched_at=now):
+            continue
+        claimed.append(schedule.pk)
+        # Reminders that fell behind until after the start are dropped.
+        if schedule.due_at + schedule.offset <= now:
+            continue
+        jobs.extend(
+            deliver_reminder_chunk.s(schedule.pk, after_id, upto_id)
+            for after_id, upto_id in reminder_chunk_bounds(schedule, chunk_size)
+        )
+    if not jobs:
+        return summarize_reminder_run([])
+
+    try:
+        chord(jobs)(summarize_reminder_run.s())
+    except Exception:
+        # Hand the schedules back to the next run.
+        ScheduledReminder.objects.filter(pk__in=claimed).update(dispatched_at=None)
+        raise
+    return {"chunks": len(jobs)}
+
+
+def reminder_chunk_bounds(schedule, chunk_size):
+    """Yield ``(after_id, upto_id)`` bounds that split the pending attendees of ``schedule``.
+
+    Each bound costs one query reading a single id. The last range is open
+    ended, so it also takes attendees who registered after the split.
+    """
+    pending = (
+        pending_reminder_attendees(schedule.pk)
+        .filter(event_id=schedule.event_id)
+        .order_by("id")
+        .values_list("id", flat=True)
     )
-    
-    for event in upcoming_events:
-        days_until_event = (event.date - timezone.now()).days
-        
-        for attendee in event.attendees.all():
-         
-            if Reminder.objects.filter(
-                attendee=attendee,
-                sent_at__date=timezone.now().date()
-            ).exists():
-                continue
-            
-            
-            if days_until_event <= 1:
-                message = f"REMINDER: The event '{event.title}' is TOMORROW at {event.date.strftime('%H:%M')} in {event.location}."
-            else:
-                message = f"REMINDER: The event '{event.title}' is coming up in {days_until_event} days at {event.date.strftime('%H:%M')} in {event.location}."
-            
-            # Send email reminder
-            send_email_reminder(attendee, event, message)
-            
+    after_id = None
+    while True:
+        remaining = pending if after_id is None else pending.filter(pk__gt=after_id)
+        upto_id = next(iter(remaining[chunk_size - 1:chunk_size]), None)
+        if upto_id is None:
+            if remaining.exists():
+                yield after_id, None
+            return
+        yield after_id, str(upto_id)
+        after_id = str(upto_id)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def deliver_reminder_chunk(self, schedule_id, after_id=None, upto_id=None, attendee_ids=None, sent=0):
+    """Send the reminder ``schedule_id`` to the pending attendees with ids in ``(after_id, upto_id]``.
+
+    The reminder rows are written as claims before anything is sent, inside a
+    transaction that locks the attendee rows, and the claims of failed sends
+    are removed afterwards. A duplicated chunk therefore skips every channel
+    that was already claimed instead of messaging anyone twice. Failed sends
+    are retried with ``attendee_ids`` narrowed to the attendees concerned;
+    ``sent`` carries the count of the earlier attempts. Chunks of a schedule
+    that was moved or cancelled since are dropped.
+    """
+    schedule = (
+        ScheduledReminder.objects.select_related("event")
+        .only("id", "event__id", "event__title", "event__date", "event__time", "event__location")
+        .filter(pk=schedule_id)
+        .first()
+    )
+    if schedule is None:
+        return {"sent": sent, "failed": 0}
+    subject, message = render_reminder(schedule.event, timezone.now())
+
+    pending = pending_reminder_attendees(schedule.pk).filter(event_id=schedule.event_id)
+    if after_id is not None:
+        pending = pending.filter(pk__gt=after_id)
+    if upto_id is not None:
+        pending = pending.filter(pk__lte=upto_id)
+    if attendee_ids is not None:
+        pending = pending.filter(pk__in=attendee_ids)
+
+    with transaction.atomic():
+        attendees = list(pending.select_for_update(skip_locked=True))
+
+        claims = []
+        for attendee in attendees:
+            if attendee.email_due:
+                claims.append(Reminder(attendee=attendee, schedule=schedule, message=message, type="EMAIL"))
             # Send WhatsApp reminder if phone number is available
-            if attendee.phone_number:
-                send_whatsapp_reminder(attendee, message)
+            if attendee.whatsapp_due:
+                claims.append(Reminder(attendee=attendee, schedule=schedule, message=message, type="WHATSAPP"))
+        Reminder.objects.bulk_create(claims)
+
+    failed = []
+    emails = [claim for claim in claims if claim.type == "EMAIL"]
+    with BatchMailer() as mailer:
+        for claim in emails:
+            if not send_email_reminder(mailer, claim.attendee, subject, message):
+                failed.append(claim)
+
+    whatsapps = [claim for claim in claims if claim.type == "WHATSAPP"]
+    results = send_whatsapp_messages(
+        (claim.attendee.phone_number, claim.message) for claim in whatsapps
+    )
+    failed.extend(claim for claim, ok in zip(whatsapps, results) if not ok)
+
+    sent += len(claims) - len(failed)
+    if failed:
+        Reminder.objects.filter(pk__in=[claim.pk for claim in failed]).delete()
+        if self.request.retries < self.max_retries:
+            raise self.retry(
+                args=(schedule_id, after_id, upto_id),
+                kwargs={
+                    "attendee_ids": sorted({str(claim.attendee_id) for claim in failed}),
+                    "sent": sent,
+                },
+            )
+
+    return {"sent": sent, "failed": len(failed)}
+
+
+@shared_task
+def summarize_reminder_run(results):
+    """Add up the per-chunk counts of a reminder run."""
+    summary = {"chunks": len(results), "sent": 0, "failed": 0}
+    for result in results:
+        for key in ("sent", "failed"):
+            summary[key] += result.get(key, 0)
+    logger.info("Reminder run finished: %s", summary)
+    return summary
+
+
+@shared_task
+def dispatch_email_outbox():
+    """Send the queued emails in ``EmailOutbox`` in batches.
+
+    Each batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+    dispatchers can drain the outbox at once. Failed messages are retried with
+    exponential backoff until ``EMAIL_OUTBOX_MAX_ATTEMPTS`` is reached.
+    """
+    batch_size = getattr(settings, "EMAIL_OUTBOX_BATCH_SIZE", 100)
+    max_attempts = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+    sent = failed = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(
+                EmailOutbox.objects.filter(
+                    sent_at__isnull=True,
+                    available_at__lte=timezone.now(),
+                    attempts__lt=max_attempts,
+                )
+                .order_by("available_at")
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not batch:
+                break
+
+            with BatchMailer() as mailer:
+                results = [
+                    mailer.send(
+                        EmailMessage(
+                            subject=item.subject,
+                            body=item.body,
+                            from_email=f'{settings.DEFAULT_FROM_EMAIL}',
+                            to=[item.recipient],
+                        )
+                    )
+                    for item in batch
+                ]
+
+            now = timezone.now()
+            delivered = [item.pk for item, ok in zip(batch, results) if ok]
+            retries = [item for item, ok in zip(batch, results) if not ok]
+            EmailOutbox.objects.filter(pk__in=delivered).update(sent_at=now)
+            for item in retries:
+                item.attempts += 1
+                item.available_at = now + timedelta(seconds=30 * 2 ** item.attempts)
+            EmailOutbox.objects.bulk_update(retries, ["attempts", "available_at"])
+
+        sent += len(delivered)
+        failed += len(retries)
+        if len(batch) < batch_size:
+            break
+
+    return {"sent": sent, "failed": failed}
 
-def send_email_reminder(attendee, event, message):
-    """Send email reminder to an attendee"""
+
+def wake_email_outbox():
+    """Ask a worker to drain the outbox now rather than on the next beat."""
     try:
-        send_mail(
-            subject=f"Reminder: {event.title}",
-            message=message,
-            from_email= f'{settings.DEFAULT_FROM_EMAIL}',
-            recipient_list=[attendee.email],
-            fail_silently=False,
-        )
-        
-        # Record the reminder
-        Reminder.objects.create(
-            attendee=attendee,
-            message=message,
-            type='EMAIL'
-        )
-        
-    except Exception as e:
-        print(f"Failed to send email reminder: {str(e)}")
+        dispatch_email_outbox.delay()
+    except Exception:
+        # The beat schedule picks the email up anyway.
+        logger.warning("Could not enqueue dispatch_email_outbox", exc_info=True)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def transfer_flyer(self, event_id):
+    """Move an event's staged flyer to the flyer storage.
+
+    Failed uploads are retried; after the last attempt the event is marked
+    ``FAILED`` and the staged file is kept so the transfer can be run again.
+    """
+    event = Event.objects.filter(pk=event_id).first()
+    if event is None or not event.flyer_staged:
+        return False
+
+    try:
+        return event.publish_flyer()
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            Event.objects.filter(pk=event_id, flyer_staged=event.flyer_staged.name).update(
+                flyer_status="FAILED"
+            )
+            raise
+        raise self.retry(exc=exc)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_flyer_variants(self, event_id):
+    """Render the resized WebP copies of an event's flyer.
+
+    Nothing is rendered when the variants already belong to the current
+    flyer, and the result is only stored if the flyer did not change meanwhile.
+    """
+    event = Event.objects.filter(pk=event_id).only("id", "flyer", "flyer_variants").first()
+    if event is None or not event.flyer:
+        return {}
+    if event.flyer_variants.get("source") == event.flyer.name:
+        return event.flyer_variants
+
+    try:
+        variants = build_flyer_variants(event.flyer)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning("Flyer of event %s is not a usable image", event_id, exc_info=True)
+        return {}
+    except Exception as exc:
+        raise self.retry(exc=exc)
+
+    stored = Event.objects.filter(pk=event_id, flyer=event.flyer.name).update(
+        flyer_variants=variants, updated_at=timezone.now()
+    )
+    if stored:
+        public_events_cache.invalidate()
+    return variants
+
+
+@shared_task
+def transfer_pending_flyers():
+    """Requeue staged flyers whose transfer was never enqueued or got lost."""
+    stale = timezone.now() - timedelta(minutes=10)
+    pending = Event.objects.filter(flyer_status="PENDING", flyer_staged_at__lt=stale).values_list("id", flat=True)
+    for event_id in pending:
+        transfer_flyer.delay(str(event_id))
+    return len(pending)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def answer_whatsapp_message(self, inbound_id):
+    """Answer a message stored by the WhatsApp webhook, at most once.
+
+    Returns the worker's answer cache counters so the savings show up in the
+    task results.
+    """
+    inbound = InboundMessage.objects.filter(pk=inbound_id, answered_at__isnull=True).first()
+    if inbound is None:
+        return answer_cache.stats()
 
-def send_whatsapp_reminder(attendee, message):
-    """Send WhatsApp reminder to an attendee"""
     try:
-      
-        send_whatsapp_message(attendee.phone_number, message)
-        
-        
-        Reminder.objects.create(
-            attendee=attendee,
-            message=message,
-            type='WHATSAPP'
+        answer_inbound_message(inbound)
+    except Exception as exc:
+        raise self.retry(exc=exc)
+
+    inbound.answered_at = timezone.now()
+    inbound.save(update_fields=["answered_at"])
+    return answer_cache.stats()
+
+
+@shared_task
+def answer_unanswered_messages():
+    """Requeue webhook messages whose answer was never enqueued or got lost.
+
+    Messages older than an hour are left alone; an answer that late is
+    no longer worth sending.
+    """
+    now = timezone.now()
+    unanswered = InboundMessage.objects.filter(
+        answered_at__isnull=True,
+        received_at__lt=now - timedelta(minutes=5),
+        received_at__gte=now - timedelta(hours=1),
+    ).values_list("id", flat=True)
+    for inbound_id in unanswered:
+        answer_whatsapp_message.delay(inbound_id)
+    return len(unanswered)
+
+
+def pending_reminder_attendees(schedule_id):
+    """Attendees still owed the reminder ``schedule_id`` on some channel.
+
+    ``email_due`` and ``whatsapp_due`` say which channels; WhatsApp is only
+    due for attendees with a phone number.
+    """
+    reminded = Reminder.objects.filter(attendee=OuterRef("pk"), schedule_id=schedule_id)
+    return (
+        Attendee.objects.annotate(
+            email_due=~Exists(reminded.filter(type="EMAIL")),
+            whatsapp_due=ExpressionWrapper(
+                ~Q(phone_number="") & ~Exists(reminded.filter(type="WHATSAPP")), output_field=BooleanField()
+            ),
         )
-        
-    except Exception as e:
-        print(f"Failed to send WhatsApp reminder: {str(e)}")
\ No newline at end of file
+        .filter(Q(email_due=True) | Q(whatsapp_due=True))
+        .only("id", "event_id", "name", "email", "phone_number")
+        .order_by()
+    )
+
+
+def render_reminder(event, now):
+    """Return the ``(subject, message)`` pair shared by every attendee of ``event``."""
+    days_until_event = (event.date - timezone.localdate(now)).days
+    at = event.time.strftime("%H:%M")
+    if days_until_event <= 0:
+        message = f"REMINDER: The event '{event.title}' is TODAY at {at} in {event.location}."
+    elif days_until_event == 1:
+        message = f"REMINDER: The event '{event.title}' is TOMORROW at {at} in {event.location}."
+    else:
+        message = f"REMINDER: The event '{event.title}' is coming up in {days_until_event} days at {at} in {event.location}."
+    return f"Reminder: {event.title}", message
+
+
+def send_email_reminder(mailer, attendee, subject, message):
+    """Send email reminder to an attendee over the mailer's open connection"""
+    email = EmailMessage(
+        subject=subject,
+        body=message,
+        from_email=f'{settings.DEFAULT_FROM_EMAIL}',
+        to=[attendee.email],
+    )
+    return mailer.send(email)
+
@@ -1,3 +1,1336 @@
-from django.test import TestCase
+import csv
+import hashlib
+import importlib
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, time as clock, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date, urlencode
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .accounts import create_account
+from .authentication import shared_cache_ttl, token_cache_key
+from . import async_views, exports, tasks
+from .cache import LRUCache, ResponseCache, public_events_cache
+from .mail import BatchMailer
+from .models import Attendee, EmailOutbox, Event, InboundMessage, Reminder, ScheduledReminder, UserProfile
+from .pagination import KeysetPagination
+from .phone import normalize_phone_number
+from .search import missing_search_objects, search_events, search_index_out_of_step
+from .serializers import AttendeeSerializer, EventSerializer
+from .utils import (
+    answer_cache,
+    answer_event_question,
+    get_whatsapp_session,
+    send_whatsapp_message,
+    send_whatsapp_messages,
+)
+from .views import register_attendee
+
+
+def create_event(creator, **fields):
+    fields.setdefault("title", "Launch party")
+    fields.setdefault("description", "Drinks and demos")
+    fields.setdefault("location", "Lagos")
+    fields.setdefault("date", date.today() + timedelta(days=30))
+    fields.setdefault("time", clock(18))
+    return Event.objects.create(creator=creator, **fields)
+
+
+def register(event, n, **fields):
+    fields.setdefault("phone_number", "")
+    return Attendee.objects.create(event=event, name=f"Attendee {n}", email=f"attendee{n}@example.com", **fields)
+
+
+class ParallelRegistrationTests(TransactionTestCase):
+    def test_parallel_registrations_never_oversell(self):
+        capacity, registrations = 5, 20
+        event = create_event(User.objects.create(username="host"), capacity=capacity)
+        url = f"/api/register-event/{event.registration_link}/"
+        start = threading.Barrier(registrations)
+        statuses = []
+
+        def attend(n):
+            client = APIClient()
+            start.wait()
+            try:
+                response = client.post(
+                    url, {"name": f"Guest {n}", "email": f"guest{n}@example.com", "phone_number": f"+2348000000{n:03d}"}
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attend, args=(n,)) for n in range(registrations)]
+        # There is no broker here; waking the outbox would only add connection timeouts.
+        with mock.patch("event.views.wake_email_outbox"):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(statuses, [201] * registrations)
+        event.refresh_from_db()
+        confirmed = event.attendees.filter(status="CONFIRMED").count()
+        self.assertEqual(confirmed, capacity)
+        self.assertEqual(event.seats_taken, capacity)
+        self.assertEqual(event.attendees.filter(status="WAITLISTED").count(), registrations - capacity)
+
+
+class CancellationTests(TestCase):
+    def setUp(self):
+        self.event = create_event(User.objects.create(username="host"), capacity=1)
+
+    def test_cancel_promotes_the_first_waitlisted_attendee(self):
+        confirmed = register(self.event, 1, status="CONFIRMED")
+        waiting = register(self.event, 2, status="WAITLISTED")
+        Event.objects.filter(pk=self.event.pk).update(seats_taken=1)
+
+        self.assertEqual(confirmed.cancel(), waiting)
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, "CONFIRMED")
+
+    def test_cancelling_a_stale_copy_twice_promotes_once(self):
+        confirmed = register(self.event, 1, status="CONFIRMED")
+        register(self.event, 2, status="WAITLISTED")
+        register(self.event, 3, status="WAITLISTED")
+        Event.objects.filter(pk=self.event.pk).update(seats_taken=1)
+        copy = Attendee.objects.get(pk=confirmed.pk)
+
+        self.assertIsNotNone(confirmed.cancel())
+        self.assertIsNone(copy.cancel())
+        self.assertEqual(self.event.attendees.filter(status="CONFIRMED").count(), 1)
+
+    def test_cancelling_a_promoted_attendee_frees_its_seat(self):
+        confirmed = register(self.event, 1, status="CONFIRMED")
+        waiting = register(self.event, 2, status="WAITLISTED")
+        Event.objects.filter(pk=self.event.pk).update(seats_taken=1)
+        stale = Attendee.objects.get(pk=waiting.pk)
+        confirmed.cancel()
+
+        self.assertIsNone(stale.cancel())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 0)
+
+
+class AttendeeCountTests(TestCase):
+    def setUp(self):
+        self.event = create_event(User.objects.create(username="host"))
+
+    def assertCount(self, expected):
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, expected)
+        self.assertEqual(self.event.attendees.count(), expected)
+
+    def test_registration_and_cancellation(self):
+        attendees = [register(self.event, n) for n in range(3)]
+        self.assertCount(3)
+        attendees[0].cancel()
+        self.assertCount(2)
+
+    def test_deleting_a_stale_copy_again_keeps_the_count(self):
+        attendee = register(self.event, 1)
+        register(self.event, 2)
+        copy = Attendee.objects.get(pk=attendee.pk)
+        attendee.cancel()
+        copy.cancel()
+        copy.delete()
+        self.assertCount(1)
+
+    def test_deleting_an_event_does_not_update_it_per_attendee(self):
+        for n in range(3):
+            register(self.event, n)
+        with CaptureQueriesContext(connection) as few:
+            self.event.delete()
+
+        other = create_event(self.event.creator, title="Bigger party")
+        for n in range(30):
+            register(other, n)
+        with CaptureQueriesContext(connection) as many:
+            other.delete()
+        self.assertEqual(len(few), len(many))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = User.objects.create(username="host")
+        self.event = create_event(self.creator)
+        self.client = APIClient()
+
+    def test_public_events_page_has_no_last_modified(self):
+        response = self.client.get("/api/public-events/")
+        self.assertNotIn("Last-Modified", response)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            register(self.event, 1)
+        refreshed = self.client.get(
+            "/api/public-events/",
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60),
+        )
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.json()["results"][0]["attendee_count"], 1)
+
+        unchanged = self.client.get("/api/public-events/", HTTP_IF_NONE_MATCH=refreshed["ETag"])
+        self.assertEqual(unchanged.status_code, 304)
+
+    def test_registrations_touch_the_event(self):
+        before = self.event.updated_at
+        register(self.event, 1)
+        self.event.refresh_from_db()
+        self.assertGreater(self.event.updated_at, before)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.responses = ResponseCache("test", fresh_for=60)
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        return f"page {self.computed}"
+
+    def test_hits_until_the_entry_goes_stale(self):
+        self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 1")
+        self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 1")
+        with mock.patch("event.cache.time.time", return_value=time.time() + 61):
+            self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 2")
+        self.assertEqual(self.responses.stats(), {"hits": 1, "stale": 0, "misses": 2})
+
+    def test_invalidate_bumps_the_generation(self):
+        self.responses.get_or_compute("/page", self.compute)
+        self.responses.get_or_compute("/other", self.compute)
+        self.responses.invalidate()
+        self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 3")
+        self.assertEqual(self.responses.get_or_compute("/other", self.compute), "page 4")
+
+    def test_stale_copies_are_served_while_another_worker_recomputes(self):
+        self.responses.get_or_compute("/page", self.compute)
+        self.responses.invalidate()
+        # Another worker won the lock and is recomputing.
+        digest = hashlib.sha1(b"/page").hexdigest()
+        cache.add(self.responses.key(f"lock:{digest}"), 1)
+
+        for _ in range(3):
+            self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 1")
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(self.responses.stats(), {"hits": 0, "stale": 3, "misses": 1})
+
+        cache.delete(self.responses.key(f"lock:{digest}"))
+        self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 2")
+        self.assertIsNone(cache.get(self.responses.key(f"lock:{digest}")))
+
+    def test_the_lock_is_released_when_computing_fails(self):
+        self.responses.get_or_compute("/page", self.compute)
+        self.responses.invalidate()
+        with self.assertRaises(RuntimeError):
+            self.responses.get_or_compute("/page", mock.Mock(side_effect=RuntimeError))
+        self.assertEqual(self.responses.get_or_compute("/page", self.compute), "page 2")
+
+    def test_registrations_invalidate_the_public_events_page(self):
+        event = create_event(User.objects.create(username="host"))
+        client = APIClient()
+        self.assertEqual(client.get("/api/public-events/").json()["results"][0]["attendee_count"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            register(event, 1)
+        self.assertEqual(client.get("/api/public-events/").json()["results"][0]["attendee_count"], 1)
+
+        stats = public_events_cache.stats()
+        client.get("/api/public-events/")
+        self.assertEqual(public_events_cache.stats()["hits"], stats["hits"] + 1)
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="host", password="s3cret-pass")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_tokens_are_not_cached_without_a_shared_cache(self):
+        self.assertEqual(shared_cache_ttl(), 0)
+        self.client.get("/api/events/")
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+
+    @override_settings(TOKEN_AUTH_CACHE_TTL=300)
+    def test_cached_token_skips_the_lookup(self):
+        self.client.get("/api/events/")
+        entry = cache.get(token_cache_key(self.token.key))
+        self.assertNotIn(self.user.password, repr(entry))
+
+        with CaptureQueriesContext(connection) as cached:
+            response = self.client.get("/api/events/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("authtoken_token" in query["sql"] for query in cached))
+
+    @override_settings(TOKEN_AUTH_CACHE_TTL=300)
+    def test_logout_revokes_the_cached_token(self):
+        self.client.get("/api/events/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post("/api/logout/").status_code, 200)
+        self.assertEqual(self.client.get("/api/events/").status_code, 401)
+
+
+class EventListQueryTests(TestCase):
+    """The event lists cost a fixed number of queries, whatever the page size."""
+
+    def setUp(self):
+        cache.clear()
+        self.creator = User.objects.create(username="host")
+        for n in range(30):
+            event = create_event(self.creator, title=f"Event {n}", time=clock(n % 24))
+            register(event, n)
+        self.token = Token.objects.create(user=self.creator)
+        self.client = APIClient()
+
+    def test_public_events_page(self):
+        for page_size in (1, 10, 30):
+            cache.clear()
+            with self.assertNumQueries(2):
+                response = self.client.get("/api/public-events/", {"page_size": page_size})
+            self.assertEqual(len(response.json()["results"]), page_size)
+
+    def test_creator_events_page(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        for page_size in (1, 10, 30):
+            with self.assertNumQueries(3):
+                response = self.client.get("/api/events/", {"page_size": page_size})
+            self.assertEqual(len(response.json()["results"]), page_size)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend", REMINDER_CHUNK_SIZE=50)
+class ReminderQueryTests(TestCase):
+    """Sending a reminder costs a few queries per chunk of attendees, none per attendee."""
+
+    def run_due_reminders(self, attendees):
+        event = create_event(User.objects.create(username=f"host{attendees}"), date=date.today() + timedelta(days=2))
+        Attendee.objects.bulk_create(
+            Attendee(event=event, name=f"Guest {n}", email=f"guest{n}@example.com", phone_number=f"+234800{n:07d}")
+            for n in range(attendees)
+        )
+        schedule = event.reminder_schedules.get(offset=timedelta(hours=24))
+
+        def run_inline(jobs):
+            return lambda callback: callback([job.apply().get() for job in jobs])
+
+        with mock.patch.object(tasks, "chord", run_inline), mock.patch.object(
+            tasks, "send_whatsapp_messages", lambda messages: [True for _ in messages]
+        ), mock.patch("django.utils.timezone.now", return_value=schedule.due_at + timedelta(seconds=1)):
+            with CaptureQueriesContext(connection) as queries:
+                tasks.send_event_reminders()
+        self.assertEqual(Reminder.objects.filter(schedule=schedule).count(), attendees * 2)
+        return len(queries)
+
+    def test_query_count_grows_with_chunks_not_attendees(self):
+        one, two, ten = (self.run_due_reminders(attendees) for attendees in (50, 100, 500))
+        per_chunk = two - one
+        # The range bound read by the coordinator, then the schedule, the
+        # locked attendees, the claims and the savepoint pair of the chunk.
+        self.assertLessEqual(per_chunk, 6)
+        self.assertEqual(ten, one + 9 * per_chunk)
+
+
+@override_settings(REMINDER_OFFSETS=[timedelta(hours=24), timedelta(hours=1)])
+class ReminderScheduleTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create(username="host")
+
+    def event_starting_in(self, delta, **fields):
+        starts_at = timezone.localtime() + delta
+        return create_event(self.host, date=starts_at.date(), time=starts_at.time().replace(microsecond=0), **fields)
+
+    def schedules(self, event):
+        return {schedule.offset: schedule for schedule in ScheduledReminder.objects.filter(event=event)}
+
+    def test_a_new_event_gets_one_schedule_per_offset(self):
+        event = self.event_starting_in(timedelta(days=3))
+        schedules = self.schedules(event)
+        self.assertEqual(
+            {offset: schedule.due_at for offset, schedule in schedules.items()},
+            {offset: event.starts_at - offset for offset in (timedelta(hours=24), timedelta(hours=1))},
+        )
+
+    def test_moving_the_event_replaces_its_schedules(self):
+        event = self.event_starting_in(timedelta(days=3))
+        attendee = register(event, 1)
+        before = self.schedules(event)
+        Reminder.objects.create(attendee=attendee, schedule=before[timedelta(hours=24)], message="Soon")
+
+        event.title = "Renamed"
+        event.save()
+        self.assertEqual(self.schedules(event), before)
+
+        event.time = clock(9) if event.time != clock(9) else clock(10)
+        event.save()
+        after = self.schedules(event)
+        self.assertFalse({schedule.pk for schedule in before.values()} & {schedule.pk for schedule in after.values()})
+        self.assertEqual(after[timedelta(hours=1)].due_at, event.starts_at - timedelta(hours=1))
+        # Sent for the old time, so the attendee is owed the new one.
+        self.assertIsNone(Reminder.objects.get().schedule)
+        self.assertTrue(tasks.pending_reminder_attendees(after[timedelta(hours=24)].pk).filter(pk=attendee.pk).exists())
+
+        event.date += timedelta(days=1)
+        event.save()
+        self.assertEqual(self.schedules(event)[timedelta(hours=24)].due_at, event.starts_at - timedelta(hours=24))
+
+    def test_deleting_the_event_cancels_its_schedules(self):
+        event = self.event_starting_in(timedelta(days=3))
+        event.delete()
+        self.assertFalse(ScheduledReminder.objects.exists())
+
+    def test_reminders_already_due_are_not_scheduled(self):
+        soon = self.event_starting_in(timedelta(hours=3))
+        self.assertEqual(list(self.schedules(soon)), [timedelta(hours=1)])
+        imminent = self.event_starting_in(timedelta(minutes=30))
+        self.assertEqual(self.schedules(imminent), {})
+
+        soon.date += timedelta(days=2)
+        soon.save()
+        self.assertEqual(set(self.schedules(soon)), {timedelta(hours=24), timedelta(hours=1)})
+
+    def test_schedules_that_fell_behind_the_start_are_dropped(self):
+        event = self.event_starting_in(timedelta(days=3))
+        register(event, 1)
+        after_start = event.starts_at + timedelta(minutes=1)
+        with mock.patch("django.utils.timezone.now", return_value=after_start), \
+                mock.patch.object(tasks, "chord") as chord:
+            self.assertEqual(tasks.send_event_reminders(), {"chunks": 0, "sent": 0, "failed": 0})
+        chord.assert_not_called()
+        self.assertFalse(ScheduledReminder.objects.filter(dispatched_at__isnull=True).exists())
+        self.assertFalse(Reminder.objects.exists())
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class ReminderChunkTests(TestCase):
+    def setUp(self):
+        event = create_event(User.objects.create(username="host"), date=date.today() + timedelta(days=2))
+        self.attendees = [register(event, n, phone_number=f"+234800000{n:04d}") for n in range(7)]
+        self.schedule = event.reminder_schedules.get(offset=timedelta(hours=24))
+
+    def test_chunk_bounds_cover_every_attendee_once(self):
+        bounds = list(tasks.reminder_chunk_bounds(self.schedule, 3))
+        self.assertEqual(len(bounds), 3)
+        self.assertIsNone(bounds[0][0])
+        self.assertIsNone(bounds[-1][1])
+        self.assertEqual([upto for _, upto in bounds[:-1]], [after for after, _ in bounds[1:]])
+
+        with mock.patch.object(tasks, "send_whatsapp_messages", lambda messages: [True for _ in messages]):
+            results = [tasks.deliver_reminder_chunk.apply(args=(self.schedule.pk, *bound)).get() for bound in bounds]
+        self.assertEqual([result["sent"] for result in results], [6, 6, 2])
+        self.assertEqual(Reminder.objects.filter(schedule=self.schedule).count(), 14)
+        self.assertEqual(list(tasks.reminder_chunk_bounds(self.schedule, 3)), [])
+
+    def test_failed_sends_are_retried_for_the_failed_channel_only(self):
+        unlucky = self.attendees[2].phone_number
+        attempts = []
+
+        def send(messages):
+            messages = list(messages)
+            attempts.append([to for to, _ in messages])
+            return [to != unlucky or len(attempts) > 1 for to, _ in messages]
+
+        with mock.patch.object(tasks, "send_whatsapp_messages", send):
+            result = tasks.deliver_reminder_chunk.apply(args=(self.schedule.pk, None, None)).get()
+
+        self.assertEqual(attempts[1], [unlucky])
+        self.assertEqual(result, {"sent": 14, "failed": 0})
+        self.assertEqual(
+            Reminder.objects.filter(schedule=self.schedule, attendee=self.attendees[2]).count(), 2
+        )
+        self.assertEqual(len(mail.outbox), 7)
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.event = create_event(User.objects.create(username="host"))
+        self.url = f"/api/register-event/{self.event.registration_link}/"
+        self.client = APIClient()
+        self.guest = {"name": "Guest", "email": "guest@example.com", "phone_number": "08012345678"}
+
+    def test_registration_queries(self):
+        # The event lookup, the attendee, its count and its email; the rest
+        # are the savepoints of the two atomic blocks.
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, self.guest)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["status"], "CONFIRMED")
+
+    def test_duplicate_registration(self):
+        self.client.post(self.url, self.guest)
+        response = self.client.post(self.url, {**self.guest, "name": "Guest again"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"non_field_errors": ["The fields event, email must make a unique set."]}
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.attendee_count, 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "The triggers are SQLite's")
+class SearchIndexRepairTests(TransactionTestCase):
+    def test_migrate_restores_dropped_triggers(self):
+        event = create_event(User.objects.create(username="host"), title="Salsa night")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER event_event_fts_update")
+        self.assertEqual(missing_search_objects(connection), ["event_event_fts_update"])
+
+        call_command("migrate", verbosity=0)
+        self.assertEqual(missing_search_objects(connection), [])
+        Event.objects.filter(pk=event.pk).update(title="Tango night")
+        self.assertEqual(list(search_events(Event.objects.all(), "tango")), [event])
+
+    def renumber_rowids(self):
+        # What a VACUUM or table rebuild may do to a table without an INTEGER PRIMARY KEY.
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE event_event SET rowid = rowid + 1000")
+            cursor.execute("UPDATE event_event SET rowid = 2000 - rowid")
+
+    def test_migrate_reindexes_renumbered_rowids(self):
+        host = User.objects.create(username="host")
+        tango = [create_event(host, title=title) for title in ("Salsa night", "Tango night", "Jazz brunch")][1]
+        self.renumber_rowids()
+        self.assertNotEqual(list(search_events(Event.objects.all(), "tango")), [tango])
+        self.assertTrue(search_index_out_of_step(connection))
+
+        call_command("migrate", verbosity=0)
+        self.assertFalse(search_index_out_of_step(connection))
+        self.assertEqual(list(search_events(Event.objects.all(), "tango")), [tango])
+
+    def test_rebuild_search_index_after_vacuum(self):
+        salsa = create_event(User.objects.create(username="host"), title="Salsa night")
+        self.renumber_rowids()
+        call_command("rebuild_search_index", vacuum=True, stdout=io.StringIO())
+        self.assertFalse(search_index_out_of_step(connection))
+        self.assertEqual(list(search_events(Event.objects.all(), "salsa")), [salsa])
+
+
+class FakeWhatsAppHandler(BaseHTTPRequestHandler):
+    """Answers by recipient: "busy-*" gets one 429, "bad-*" a 400, "slow-*" waits first."""
+
+    def do_POST(self):
+        to = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["to"]
+        with self.server.lock:
+            self.server.requests.append(to)
+            first_try = self.server.requests.count(to) == 1
+        if to.startswith("slow-"):
+            time.sleep(0.2)
+        if to.startswith("busy-") and first_try:
+            self.answer(429, {"error": "rate limited"}, {"Retry-After": "1"})
+        elif to.startswith("bad-"):
+            self.answer(400, {"error": "invalid recipient"})
+        else:
+            self.answer(200, {"messages": [{"id": f"wamid.{to}"}]})
+
+    def answer(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in dict(headers).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class WhatsAppRetryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeWhatsAppHandler)
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        self.server.requests = []
+        host, port = self.server.server_address
+        override = override_settings(WHATSAPP_API_URL=f"http://{host}:{port}/messages")
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_only_rejected_sends_are_retried(self):
+        retry = get_whatsapp_session().get_adapter("https://").max_retries
+        retried = [code for code in (429, 500, 502, 503, 504) if retry.is_retry("POST", code)]
+        self.assertEqual(retried, [429, 503])
+
+    def test_a_rate_limited_send_is_retried_after_retry_after(self):
+        started = time.monotonic()
+        response = send_whatsapp_message("busy-1", "Hello")
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        self.assertEqual(response, {"messages": [{"id": "wamid.busy-1"}]})
+        self.assertEqual(self.server.requests, ["busy-1", "busy-1"])
+
+    def test_concurrent_sends_report_in_message_order(self):
+        recipients = ["slow-1", "busy-2", "ok-3", "bad-4", "slow-5", "ok-6"]
+        with self.assertLogs("event.utils", "ERROR"):
+            results = send_whatsapp_messages([(to, "Hello") for to in recipients], max_workers=4)
+        self.assertEqual(results, [True, True, True, False, True, True])
+        self.assertEqual(sorted(self.server.requests), sorted(recipients + ["busy-2"]))
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_an_index(self):
+        # Raises CommandError naming any query that falls back to a full scan.
+        call_command("check_query_plans", seed=500, stdout=io.StringIO())
+
+
+class AttendeeImportTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create(username="host")
+        self.event = create_event(self.creator, capacity=2)
+        register(self.event, 0, status="CONFIRMED")
+        Event.objects.filter(pk=self.event.pk).update(seats_taken=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(
+            f"/api/events/{self.event.pk}/attendees/import/", {"file": upload, **data}, format="multipart"
+        )
+
+    def assertImported(self, response, created, waitlisted, duplicates, invalid):
+        self.assertIn(response.status_code, (200, 201), response.content)
+        report = response.json()
+        self.assertEqual(
+            (report["created"], report["waitlisted"], report["duplicates"], report["invalid"]),
+            (created, waitlisted, duplicates, invalid),
+            report,
+        )
+        return report
+
+    def test_csv(self):
+        content = (
+            "name,email,phone_number\n"
+            "Ada,ada@example.com,08012345678\n"
+            "Bayo,not-an-email,08012345678\n"
+            "Chi,chi@example.com,08012345678\n"
+            "Ada again,ada@example.com,08012345678\n"
+            "Old,attendee0@example.com,08012345678\n"
+            "Dayo,dayo@example.com,08012345678\n"
+        ).encode()
+        report = self.assertImported(self.upload("guests.csv", content), created=3, waitlisted=2, duplicates=2, invalid=1)
+        self.assertEqual(sorted(error["row"] for error in report["errors"]), [3, 5, 6])
+
+        statuses = dict(self.event.attendees.values_list("email", "status"))
+        self.assertEqual(statuses["ada@example.com"], "CONFIRMED")
+        self.assertEqual(statuses["chi@example.com"], "WAITLISTED")
+        self.assertEqual(statuses["dayo@example.com"], "WAITLISTED")
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.seats_taken, self.event.attendee_count), (2, 4))
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_ndjson_with_notify(self):
+        content = b"\n".join([
+            b'{"name": "Ada", "email": "ada@example.com", "phone_number": "08012345678"}',
+            b"not json",
+            b"[1, 2]",
+            b'{"name": "Chi", "email": "chi@example.com", "phone_number": "08012345678"}',
+            b'{"name": "Chi", "email": "chi@example.com", "phone_number": "08012345678"}',
+        ])
+        report = self.assertImported(
+            self.upload("guests.ndjson", content, notify="true"), created=2, waitlisted=1, duplicates=1, invalid=2
+        )
+        self.assertEqual(sorted(error["row"] for error in report["errors"]), [2, 3, 5])
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list("recipient", flat=True)), ["ada@example.com", "chi@example.com"]
+        )
+
+    def test_undecodable_lines_are_reported_and_the_rest_imported(self):
+        rows = [f"Guest {n},guest{n}@example.com,08012345678\n".encode() for n in range(3)]
+        content = b"name,email,phone_number\n" + rows[0] + b"Bad,\xff\xfe@example.com,080\n" + rows[1] + rows[2]
+        report = self.assertImported(self.upload("guests.csv", content), created=3, waitlisted=2, duplicates=0, invalid=1)
+        self.assertEqual(report["errors"], [{"row": 3, "errors": {"non_field_errors": ["The line is not UTF-8 encoded."]}}])
+
+        ndjson = b'{"name": "Eve", "email": "eve@example.com", "phone_number": "08012345678"}\n\xff\n'
+        self.assertImported(self.upload("more.ndjson", ndjson), created=1, waitlisted=1, duplicates=0, invalid=1)
+
+    def test_unknown_format(self):
+        response = self.upload("guests.txt", b"hello")
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkAttendeeDeleteTests(TestCase):
+    def test_queryset_delete_updates_the_counts(self):
+        event = create_event(User.objects.create(username="host"))
+        other = create_event(event.creator, title="Other party")
+        for n in range(3):
+            register(event, n)
+            register(other, n)
+
+        Attendee.objects.filter(email__in=["attendee0@example.com", "attendee1@example.com"]).delete()
+        event.attendees.all().delete()
+        event.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((event.attendee_count, other.attendee_count), (0, 1))
+        self.assertEqual(other.attendees.count(), 1)
+
+    def test_deleting_confirmed_attendees_gives_their_seats_back(self):
+        event = create_event(User.objects.create(username="host"), capacity=3)
+        confirmed = [register(event, n, status="CONFIRMED") for n in range(3)]
+        waiting = register(event, 3, status="WAITLISTED")
+        Event.objects.filter(pk=event.pk).update(seats_taken=3)
+
+        confirmed[0].delete()
+        Attendee.objects.filter(pk__in=[confirmed[1].pk, waiting.pk]).delete()
+        event.refresh_from_db()
+        self.assertEqual((event.seats_taken, event.attendee_count), (1, 1))
+
+        Attendee.objects.get(pk=confirmed[2].pk).delete()
+        confirmed[2].delete()
+        event.refresh_from_db()
+        self.assertEqual((event.seats_taken, event.attendee_count), (0, 0))
+
+
+class AnswerCacheTests(TestCase):
+    def setUp(self):
+        self.event = create_event(User.objects.create(username="host"))
+        answer_cache.clear()
+        self.addCleanup(answer_cache.clear)
+        model = mock.Mock()
+        model.generate_content.side_effect = lambda prompt: mock.Mock(text=f"answer {model.generate_content.call_count}")
+        self.model = model
+        patcher = mock.patch("event.utils.get_gemini_model", return_value=model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ask(self, question="When does it start?"):
+        return answer_event_question(Event.objects.get(pk=self.event.pk), question)
+
+    def test_rephrased_questions_are_answered_from_the_cache(self):
+        self.assertEqual(self.ask("When does it start?"), "answer 1")
+        self.assertEqual(self.ask("when does it START"), "answer 1")
+        self.assertEqual(self.model.generate_content.call_count, 1)
+        self.assertEqual(answer_cache.stats()["hits"], 1)
+
+    def test_registrations_keep_the_cached_answers(self):
+        self.ask()
+        register(self.event, 1)
+        self.assertEqual(self.ask(), "answer 1")
+
+    def test_editing_the_event_invalidates_its_answers(self):
+        self.ask()
+        for field, value in (("time", clock(20)), ("location", "Abuja")):
+            setattr(self.event, field, value)
+            self.event.save()
+            self.ask()
+        self.assertEqual(self.model.generate_content.call_count, 3)
+
+    def test_entries_expire_and_the_least_recently_used_is_evicted(self):
+        now = [0.0]
+        lru = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertEqual((lru.get("a"), lru.get("b"), lru.get("c")), (1, None, 3))
+
+        now[0] = 10
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(lru.stats()["size"], 1)
+
+
+def png(size=(1200, 900), color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class FlyerStorageTestCase(TestCase):
+    """Puts the flyer and staging storages on temporary local directories."""
+
+    def setUp(self):
+        for name in ("flyer", "flyer_staged"):
+            location = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+            storage = FileSystemStorage(location=location, base_url="/media/")
+            patcher = mock.patch.object(Event._meta.get_field(name), "storage", storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.flyers = Event._meta.get_field("flyer").storage
+        self.staging = Event._meta.get_field("flyer_staged").storage
+        self.event = create_event(User.objects.create(username="host"))
+
+
+@mock.patch("event.models.enqueue_flyer_task")
+class FlyerStagingTests(FlyerStorageTestCase):
+    def stage(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.stage_flyer(SimpleUploadedFile(name, content, content_type="image/png"))
+        return self.event.flyer_staged.name
+
+    def test_staged_flyers_are_transferred(self, enqueue):
+        staged = self.stage("party.png", png())
+        enqueue.assert_called_once_with("transfer_flyer", self.event.pk)
+        self.assertTrue(self.staging.exists(staged))
+
+        self.assertTrue(tasks.transfer_flyer.apply(args=(str(self.event.pk),)).get())
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.flyer_status, self.event.flyer_staged.name), ("READY", ""))
+        self.assertIsNone(self.event.flyer_staged_at)
+        self.assertTrue(self.flyers.exists(self.event.flyer.name))
+        self.assertFalse(self.staging.exists(staged))
+
+    def test_a_new_upload_replaces_the_pending_one(self, enqueue):
+        first = self.stage("first.png", png(color="red"))
+        second = self.stage("second.png", png(color="blue"))
+        self.assertFalse(self.staging.exists(first))
+        self.assertTrue(self.staging.exists(second))
+
+        tasks.transfer_flyer.apply(args=(str(self.event.pk),))
+        self.event.refresh_from_db()
+        with self.event.flyer.open("rb") as flyer:
+            self.assertEqual(flyer.read(), png(color="blue"))
+        self.assertEqual(self.staging.listdir("flyers"), ([], []))
+
+    def test_the_pending_upload_is_kept_when_the_replacement_rolls_back(self, enqueue):
+        first = self.stage("first.png", png())
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.event.stage_flyer(SimpleUploadedFile("second.png", png(), content_type="image/png"))
+            raise RuntimeError("rolled back")
+        self.assertTrue(self.staging.exists(first))
+
+
+class PendingFlyerTests(TestCase):
+    def test_pending_flyers_are_requeued_by_upload_time_not_updated_at(self):
+        event = create_event(User.objects.create(username="host"))
+        long_ago = timezone.now() - timedelta(hours=1)
+        Event.objects.filter(pk=event.pk).update(
+            flyer_staged="flyers/a.png", flyer_status="PENDING", flyer_staged_at=long_ago
+        )
+        register(event, 1)
+
+        with mock.patch.object(tasks.transfer_flyer, "delay") as delay:
+            self.assertEqual(tasks.transfer_pending_flyers(), 1)
+        delay.assert_called_once_with(str(event.pk))
+
+        Event.objects.filter(pk=event.pk).update(flyer_staged_at=timezone.now())
+        with mock.patch.object(tasks.transfer_flyer, "delay") as delay:
+            self.assertEqual(tasks.transfer_pending_flyers(), 0)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.event = create_event(User.objects.create(username="host"))
+        self.url = f"/api/register-event/{self.event.registration_link}/"
+
+    def attendee(self, n):
+        return {"name": f"Guest {n}", "email": f"guest{n}@example.com", "phone_number": "08012345678"}
+
+    async def test_register_event_accepts_json_form_and_multipart(self):
+        requests = [
+            self.factory.post(self.url, self.attendee(1), content_type="application/json"),
+            self.factory.post(self.url, urlencode(self.attendee(2)), content_type="application/x-www-form-urlencoded"),
+            self.factory.post(self.url, self.attendee(3)),
+        ]
+        for request in requests:
+            response = await async_views.register_event(request, registration_link=self.event.registration_link)
+            self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(await self.event.attendees.acount(), 3)
+
+        response = await async_views.register_event(
+            self.factory.post(self.url, self.attendee(1), content_type="application/json"),
+            registration_link=self.event.registration_link,
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_malformed_bodies_are_rejected(self):
+        response = await async_views.register_event(
+            self.factory.post(self.url, "{not json", content_type="application/json"),
+            registration_link=self.event.registration_link,
+        )
+        self.assertEqual(response.status_code, 400)
+        response = await async_views.register_event(
+            self.factory.post(self.url, "<attendee/>", content_type="application/xml"),
+            registration_link=self.event.registration_link,
+        )
+        self.assertEqual(response.status_code, 415)
+        response = await async_views.register_event(
+            self.factory.post("/api/register-event/nope/", self.attendee(1), content_type="application/json"),
+            registration_link="nope",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_signup_accepts_a_form(self):
+        body = {
+            "username": "ada",
+            "email": "ada@example.com",
+            "phone_number": "08012345678",
+            "password": "correct horse battery",
+            "confirm_password": "correct horse battery",
+        }
+        response = await async_views.register(
+            self.factory.post("/api/register/", urlencode(body), content_type="application/x-www-form-urlencoded")
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(await Token.objects.filter(user__username="ada").aexists())
+
+    async def test_public_events_lists_and_rejects_bad_cursors(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            response = await async_views.public_events(self.factory.get("/api/public-events/"))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row["id"] for row in json.loads(response.content)["results"]], [str(self.event.pk)])
+
+            response = await async_views.public_events(self.factory.get("/api/public-events/?cursor=bogus"))
+            self.assertEqual(response.status_code, 404)
+
+
+class WhatsAppWebhookTests(TestCase):
+    url = "/api/whatsapp/webhook/"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.event = create_event(User.objects.create(username="host"))
+        register(self.event, 1, phone_number="+2348012345678")
+        answer_cache.clear()
+        self.addCleanup(answer_cache.clear)
+
+    def post(self, **payload):
+        payload.setdefault("from", "+2348012345678")
+        payload.setdefault("message", {"text": {"body": "Where is it?"}})
+        return self.client.post(self.url, payload, format="json")
+
+    def test_redelivered_messages_are_stored_and_queued_once(self):
+        with mock.patch.object(tasks.answer_whatsapp_message, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.post(id="wamid.1")
+            with self.captureOnCommitCallbacks(execute=True):
+                again = self.post(id="wamid.1")
+
+        self.assertEqual(first.json(), {"success": True})
+        self.assertEqual(again.json(), {"success": True, "duplicate": True})
+        inbound = InboundMessage.objects.get()
+        delay.assert_called_once_with(inbound.pk)
+
+    def test_messages_without_an_id_are_rejected(self):
+        self.assertEqual(self.post().status_code, 400)
+        self.assertFalse(InboundMessage.objects.exists())
+
+    def test_the_worker_answers_once(self):
+        inbound = InboundMessage.objects.create(message_id="wamid.2", phone_number="08012345678", body="Where is it?")
+        model = mock.Mock()
+        model.generate_content.return_value = mock.Mock(text="In Lagos.")
+        with mock.patch("event.utils.get_gemini_model", return_value=model), \
+                mock.patch("event.utils.send_whatsapp_message") as send:
+            tasks.answer_whatsapp_message.apply(args=(inbound.pk,))
+            tasks.answer_whatsapp_message.apply(args=(inbound.pk,))
+
+        send.assert_called_once_with("08012345678", "In Lagos.")
+        inbound.refresh_from_db()
+        self.assertIsNotNone(inbound.answered_at)
+
+    def test_lost_answers_are_requeued(self):
+        now = timezone.now()
+        ages = {"fresh": timedelta(minutes=1), "lost": timedelta(minutes=10), "expired": timedelta(hours=2)}
+        for message_id, age in ages.items():
+            InboundMessage.objects.create(message_id=message_id, phone_number="08012345678", body="Hi")
+            InboundMessage.objects.filter(message_id=message_id).update(received_at=now - age)
+        InboundMessage.objects.create(message_id="answered", phone_number="08012345678", body="Hi", answered_at=now)
+        InboundMessage.objects.filter(message_id="answered").update(received_at=now - ages["lost"])
+
+        with mock.patch.object(tasks.answer_whatsapp_message, "delay") as delay:
+            self.assertEqual(tasks.answer_unanswered_messages(), 1)
+        delay.assert_called_once_with(InboundMessage.objects.get(message_id="lost").pk)
+
+
+class FakeSMTPConnection:
+    """Records sessions and messages; raises ``drop_on`` for the given send numbers."""
+
+    def __init__(self, drop_on=(), error=SMTPServerDisconnected):
+        self.drop_on = set(drop_on)
+        self.error = error
+        self.sessions = []
+        self.sends = 0
+
+    def open(self):
+        self.sessions.append([])
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        self.sends += 1
+        if self.sends in self.drop_on:
+            raise self.error("Connection unexpectedly closed")
+        self.sessions[-1].extend(message.to[0] for message in messages)
+        return len(messages)
+
+
+class BatchMailerTests(TestCase):
+    def messages(self, count):
+        return [EmailMessage("Hi", "Body", "from@example.com", [f"guest{n}@example.com"]) for n in range(count)]
+
+    def test_sessions_roll_over_after_max_per_connection(self):
+        connection = FakeSMTPConnection()
+        with BatchMailer(max_per_connection=2, connection=connection) as mailer:
+            results = [mailer.send(message) for message in self.messages(5)]
+        self.assertEqual(results, [True] * 5)
+        self.assertEqual([len(session) for session in connection.sessions], [2, 2, 1])
+
+    def test_a_dropped_connection_is_reopened_once(self):
+        connection = FakeSMTPConnection(drop_on={2})
+        with BatchMailer(max_per_connection=10, connection=connection) as mailer:
+            results = [mailer.send(message) for message in self.messages(3)]
+        self.assertEqual(results, [True] * 3)
+        self.assertEqual(
+            connection.sessions,
+            [["guest0@example.com"], ["guest1@example.com", "guest2@example.com"]],
+        )
+
+    def test_a_message_is_given_up_when_the_reconnect_fails_too(self):
+        connection = FakeSMTPConnection(drop_on={2, 3})
+        with self.assertLogs("event.mail", "ERROR"), BatchMailer(connection=connection) as mailer:
+            results = [mailer.send(message) for message in self.messages(3)]
+        self.assertEqual(results, [True, False, True])
+        self.assertEqual(len(connection.sessions), 3)
+
+    def test_other_errors_fail_the_message_without_reconnecting(self):
+        connection = FakeSMTPConnection(drop_on={1}, error=SMTPRecipientsRefused)
+        with self.assertLogs("event.mail", "ERROR"), BatchMailer(connection=connection) as mailer:
+            results = [mailer.send(message) for message in self.messages(2)]
+        self.assertEqual(results, [False, True])
+        self.assertEqual(len(connection.sessions), 1)
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    EMAIL_OUTBOX_BATCH_SIZE=2,
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.event = create_event(User.objects.create(username="host"))
+        self.guest = {"name": "Guest", "email": "guest@example.com", "phone_number": "08012345678"}
+
+    def test_the_email_is_queued_with_the_registration(self):
+        response = APIClient().post(f"/api/register-event/{self.event.registration_link}/", self.guest)
+        self.assertEqual(response.status_code, 201)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual(queued.attendee_id, uuid.UUID(response.json()["id"]))
+        self.assertEqual(queued.recipient, "guest@example.com")
+        self.assertIsNone(queued.sent_at)
+
+    def test_nothing_is_queued_when_the_registration_rolls_back(self):
+        serializer = AttendeeSerializer(data=self.guest)
+        serializer.is_valid(raise_exception=True)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            register_attendee(serializer, self.event)
+            raise RuntimeError("rolled back after the registration")
+        self.assertFalse(Attendee.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_the_registration_rolls_back_when_queueing_fails(self):
+        serializer = AttendeeSerializer(data=self.guest)
+        serializer.is_valid(raise_exception=True)
+        with mock.patch.object(EmailOutbox, "save", side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            register_attendee(serializer, self.event)
+        self.assertFalse(Attendee.objects.exists())
+
+    def queue(self, *recipients):
+        return [
+            EmailOutbox.objects.create(recipient=recipient, subject="Hi", body="Body") for recipient in recipients
+        ]
+
+    def test_delivered_rows_are_marked_sent_in_batches(self):
+        self.queue("a@example.com", "b@example.com", "c@example.com")
+        self.assertEqual(tasks.dispatch_email_outbox(), {"sent": 3, "failed": 0})
+        self.assertFalse(EmailOutbox.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["a@example.com", "b@example.com", "c@example.com"])
+        self.assertEqual(tasks.dispatch_email_outbox(), {"sent": 0, "failed": 0})
+
+    def test_failures_back_off_until_the_last_attempt(self):
+        good, bad = self.queue("good@example.com", "bad@example.com")
+        original = BatchMailer.send
+
+        def send(mailer, message):
+            return message.to != ["bad@example.com"] and original(mailer, message)
+
+        with mock.patch.object(BatchMailer, "send", send):
+            before = timezone.now()
+            self.assertEqual(tasks.dispatch_email_outbox(), {"sent": 1, "failed": 1})
+            bad.refresh_from_db()
+            self.assertEqual(bad.attempts, 1)
+            self.assertGreaterEqual(bad.available_at, before + timedelta(seconds=60))
+            # Not due yet.
+            self.assertEqual(tasks.dispatch_email_outbox(), {"sent": 0, "failed": 0})
+
+            EmailOutbox.objects.filter(pk=bad.pk).update(available_at=timezone.now())
+            self.assertEqual(tasks.dispatch_email_outbox(), {"sent": 0, "failed": 1})
+            EmailOutbox.objects.filter(pk=bad.pk).update(available_at=timezone.now())
+            # Two attempts is the limit; the row is left alone from now on.
+            self.assertEqual(tasks.dispatch_email_outbox(), {"sent": 0, "failed": 0})
+
+        bad.refresh_from_db()
+        good.refresh_from_db()
+        self.assertEqual((bad.attempts, bad.sent_at), (2, None))
+        self.assertIsNotNone(good.sent_at)
+
+
+class FlyerVariantTests(FlyerStorageTestCase):
+    def set_flyer(self, event, name, content):
+        name = self.flyers.save(f"images/{name}", ContentFile(content))
+        Event.objects.filter(pk=event.pk).update(flyer=name)
+        return name
+
+    def render(self, event):
+        with mock.patch.object(tasks.public_events_cache, "invalidate"):
+            return tasks.generate_flyer_variants.apply(args=(str(event.pk),)).get()
+
+    def test_variants_are_webp_scaled_to_fit(self):
+        source = self.set_flyer(self.event, "party.png", png((1200, 900)))
+        variants = self.render(self.event)
+
+        self.assertEqual(variants["source"], source)
+        sizes = {}
+        for variant, name in variants["files"].items():
+            with self.flyers.open(name) as file, Image.open(file) as image:
+                self.assertEqual(image.format, "WEBP")
+                sizes[variant] = image.size
+        self.assertEqual(sizes, {"thumb": (320, 240), "card": (600, 450)})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.flyer_variants, variants)
+
+    def test_the_same_image_reuses_its_variants(self):
+        self.set_flyer(self.event, "party.png", png())
+        first = self.render(self.event)
+        other = create_event(self.event.creator, title="Encore")
+        self.set_flyer(other, "party-again.png", png())
+
+        with mock.patch("event.images.render_variant") as render_variant:
+            second = self.render(other)
+        render_variant.assert_not_called()
+        self.assertEqual(second["files"], first["files"])
+        self.assertEqual(len(self.flyers.listdir("images/variants")[1]), 2)
+        # Nothing is rendered again for a flyer whose variants are current.
+        with mock.patch("event.tasks.build_flyer_variants") as build:
+            self.assertEqual(self.render(other), second)
+        build.assert_not_called()
+
+    def test_the_serializer_lists_variant_urls(self):
+        self.set_flyer(self.event, "party.png", png())
+        files = self.render(self.event)["files"]
+        self.event.refresh_from_db()
+
+        self.assertEqual(
+            EventSerializer(self.event).data["flyer_variants"],
+            {variant: f"/media/{name}" for variant, name in files.items()},
+        )
+        request = APIRequestFactory().get("/api/public-events/")
+        self.assertEqual(
+            EventSerializer(self.event, context={"request": request}).data["flyer_variants"]["thumb"],
+            f"http://testserver/media/{files['thumb']}",
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = User.objects.create(username="host")
+        self.client = APIClient()
+        self.client.force_authenticate(self.host)
+
+    def walk(self, url, **params):
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row["id"] for row in response.json()["results"])
+            pages += 1
+            if not response.json()["next"]:
+                return ids, pages
+            response = self.client.get(response.json()["next"])
+
+    def test_event_pages_have_no_gaps_or_duplicates(self):
+        soon = date.today() + timedelta(days=3)
+        # Equal dates and times, so the id has to break the ties.
+        events = [create_event(self.host, date=soon + timedelta(days=n % 3), time=clock(18 + n % 2)) for n in range(8)]
+        for n, event in enumerate(events):
+            Event.objects.filter(pk=event.pk).update(attendee_count=n % 3)
+        expected = [str(event.pk) for event in sorted(events, key=lambda e: (e.date, e.time, str(e.pk)))]
+
+        for url in ("/api/public-events/", "/api/events/"):
+            self.assertEqual(self.walk(url, page_size=3), (expected, 3))
+
+        popular = sorted(events, key=lambda e: (-Event.objects.get(pk=e.pk).attendee_count, str(e.pk)))
+        ids, _ = self.walk("/api/public-events/", page_size=2, ordering="popular")
+        self.assertEqual(ids, [str(event.pk) for event in popular])
+
+    def test_attendee_pages_have_no_gaps_or_duplicates(self):
+        event = create_event(self.host)
+        attendees = [register(event, n) for n in range(7)]
+        # Registrations in the same instant.
+        Attendee.objects.filter(pk__in=[a.pk for a in attendees[2:5]]).update(registered_at=attendees[2].registered_at)
+
+        ids, pages = self.walk(f"/api/events/{event.pk}/attendees/", page_size=2)
+        self.assertEqual(pages, 4)
+        self.assertEqual(sorted(ids), sorted(str(a.pk) for a in attendees))
+        self.assertEqual(len(set(ids)), 7)
+
+    def test_invalid_cursors_are_not_found(self):
+        event = create_event(self.host)
+        encode = KeysetPagination().encode_cursor
+        for cursor in ("not-base64!", encode(["2026-01-01"]), encode(["soon", "18:00", str(event.pk)]), encode({"a": 1})):
+            for url in ("/api/public-events/", "/api/events/", f"/api/events/{event.pk}/attendees/"):
+                response = self.client.get(url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 404, (url, cursor))
+                self.assertEqual(response.json(), {"detail": "Invalid cursor"})
+
+    def test_page_size_is_clamped(self):
+        event = create_event(self.host)
+        Attendee.objects.bulk_create(
+            Attendee(event=event, name=f"Guest {n}", email=f"guest{n}@example.com") for n in range(210)
+        )
+        url = f"/api/events/{event.pk}/attendees/"
+        for page_size, expected in (("1000", 200), ("0", 50), ("-5", 50), ("lots", 50), ("7", 7)):
+            results = self.client.get(url, {"page_size": page_size}).json()["results"]
+            self.assertEqual(len(results), expected, page_size)
+
+
+class AttendeeExportTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create(username="host")
+        self.event = create_event(self.host)
+        self.attendees = [register(self.event, n, phone_number=f"+23480000000{n}") for n in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.host)
+        self.url = f"/api/events/{self.event.pk}/attendees/"
+
+    def export(self, fmt):
+        response = self.client.get(self.url, {"export": fmt})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response["Content-Disposition"], f'attachment; filename="attendees-{self.event.pk}.{fmt}"'
+        )
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        response, body = self.export("csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ["id", "name", "email", "phone_number", "status", "registered_at"])
+        self.assertEqual(
+            [row[:5] for row in rows[1:]],
+            [[str(a.pk), a.name, a.email, a.phone_number, "CONFIRMED"] for a in self.attendees],
+        )
+        self.assertEqual(rows[1][5], self.attendees[0].registered_at.isoformat())
+
+    def test_ndjson_export(self):
+        response, body = self.export("ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record["email"] for record in records], [a.email for a in self.attendees])
+        self.assertEqual(set(records[0]), {"id", "name", "email", "phone_number", "status", "registered_at"})
+
+    def test_rows_are_written_in_batches(self):
+        rows = exports.attendee_rows(self.event.attendees.all(), chunk_size=2)
+        chunks = list(exports.ndjson_lines(rows, lines_per_write=2))
+        self.assertEqual([chunk.count("\n") for chunk in chunks], [2, 1])
+
+    def test_unknown_formats_are_rejected(self):
+        response = self.client.get(self.url, {"export": "xlsx"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"export": ["Choose one of: csv, ndjson."]})
+
+    def test_other_creators_cannot_export(self):
+        self.client.force_authenticate(User.objects.create(username="someone-else"))
+        self.assertEqual(self.client.get(self.url, {"export": "csv"}).status_code, 404)
+
+
+class SignupTests(TestCase):
+    body = {
+        "username": "ada",
+        "email": "ada@example.com",
+        "phone_number": "08012345678",
+        "password": "correct horse battery",
+        "confirm_password": "correct horse battery",
+    }
+
+    def writes(self, queries):
+        """The ``INSERT INTO table``, ``UPDATE table`` and ``DELETE FROM table`` heads of ``queries``."""
+        writes = (re.match(r'(INSERT INTO|UPDATE|DELETE FROM) "?(\w+)', query["sql"]) for query in queries)
+        return [" ".join(write.groups()) for write in writes if write]
+
+    def test_a_signup_inserts_each_row_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post("/api/register/", self.body)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.writes(queries),
+            ["INSERT INTO auth_user", "INSERT INTO event_userprofile", "INSERT INTO authtoken_token"],
+        )
+        profile = UserProfile.objects.get(user__username="ada")
+        self.assertEqual((profile.phone_number, profile.phone_e164), ("08012345678", "+2348012345678"))
+        self.assertEqual(response.json()["token"], Token.objects.get(user=profile.user).key)
+
+    def test_later_user_saves_leave_the_profile_alone(self):
+        user, _ = create_account("ada", "ada@example.com", "08012345678", password="correct horse battery")
+        user = User.objects.get(pk=user.pk)
+        user.first_name = "Ada"
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertEqual(self.writes(queries), ["UPDATE auth_user"])
+        self.assertEqual(UserProfile.objects.get(user=user).phone_number, "08012345678")
+
+
+@override_settings(PHONE_DEFAULT_COUNTRY_CODE="234")
+class PhoneNumberTests(TestCase):
+    cases = [
+        ("+234 801 234 5678", "+2348012345678"),
+        ("+1 (415) 555-0100", "+14155550100"),
+        ("00447911123456", "+447911123456"),
+        ("0044 7911 123456", "+447911123456"),
+        ("08012345678", "+2348012345678"),
+        ("080-1234-5678", "+2348012345678"),
+        ("2348012345678", "+2348012345678"),
+        (" 14155550100 ", "+14155550100"),
+        ("", ""),
+        (None, ""),
+        ("12345", ""),
+        ("+1234567890123456", ""),
+        ("call me", ""),
+    ]
+
+    def test_normalize_phone_number(self):
+        for raw, expected in self.cases:
+            self.assertEqual(normalize_phone_number(raw), expected, raw)
+
+    def test_trunk_zero_uses_the_given_country_code(self):
+        self.assertEqual(normalize_phone_number("07911123456", default_country_code="44"), "+447911123456")
+        with override_settings(PHONE_DEFAULT_COUNTRY_CODE="44"):
+            self.assertEqual(normalize_phone_number("07911123456"), "+447911123456")
+
+    def test_the_backfill_migration_normalizes_the_same_way(self):
+        migration = importlib.import_module("event.migrations.0009_phone_e164")
+        for raw, expected in self.cases:
+            self.assertEqual(migration.normalize_phone_number(raw), expected, raw)
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views, utils
 import rest_framework
 
 router = DefaultRouter()
@@ -13,8 +14,25 @@ urlpatterns = [
     #path('google/login/', views.GoogleLoginView.as_view(), name='google-login'),
     path('auth/',include('rest_framework.urls')),
     path('logout/', views.logout, name='user-logout'),
-    path('register/', views.UserRegistrationView.as_view(), name='user-registration'),
-    path('public-events/', views.PublicEventListView.as_view(), name='public-events'),
+    path(
+        'register/',
+        async_views.register if settings.ASYNC_VIEWS else views.UserRegistrationView.as_view(),
+        name='user-registration',
+    ),
+    path(
+        'public-events/',
+        async_views.public_events if settings.ASYNC_VIEWS else views.PublicEventListView.as_view(),
+        name='public-events',
+    ),
     path('events/<int:id>/attendees/', views.AttendeeView.as_view(), name='attendee-list'),
-    path('register-event/<str:registration_link>/', views.EventRegistrationView.as_view(), name='event-registration'),
+    path(
+        'register-event/<str:registration_link>/',
+        async_views.register_event if settings.ASYNC_VIEWS else views.EventRegistrationView.as_view(),
+        name='event-registration',
+    ),
+    path(
+        'whatsapp/webhook/',
+        async_views.whatsapp_webhook if settings.ASYNC_VIEWS else utils.whatsapp_webhook,
+        name='whatsapp-webhook',
+    ),
 ]
@@ -1,23 +1,96 @@
+import functools
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import google.generativeai as genai
 from django.conf import settings
-from .models import Event, Attendee,UserProfile
+from django.db import IntegrityError, transaction
+from .cache import LRUCache
+from .models import Event, Attendee, InboundMessage, UserProfile
+from .phone import normalize_phone_number
+
+logger = logging.getLogger(__name__)
 
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
+_whatsapp_session = None
+_whatsapp_session_lock = threading.Lock()
+
+# Answers are keyed by event id, a hash of the event details Gemini is shown
+# and the normalized question. Editing those details makes the cached answers
+# unreachable; registrations and other counter updates do not.
+answer_cache = LRUCache(
+    maxsize=settings.GEMINI_ANSWER_CACHE_SIZE, ttl=settings.GEMINI_ANSWER_CACHE_TTL
+)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def whatsapp_webhook(request):
-    # Extract incoming WhatsApp message details
-    data = request.data
+    """Store an incoming WhatsApp message and acknowledge it straight away.
+
+    The answer is built and sent by the ``answer_whatsapp_message`` task, so
+    the provider gets its 200 without waiting for Gemini. Redelivered
+    messages are recognised by their id and acknowledged without a new answer.
+    """
+    message_id, phone_number, text = parse_inbound_message(request.data)
+    if not message_id or not phone_number or not text:
+        return Response({"message": "Invalid payload"}, status=400)
+
+    try:
+        with transaction.atomic():
+            inbound = InboundMessage.objects.create(
+                message_id=message_id, phone_number=phone_number, body=text
+            )
+            transaction.on_commit(lambda: enqueue_answer(inbound.pk))
+    except IntegrityError:
+        return Response({"success": True, "duplicate": True})
+
+    return Response({"success": True})
+
+
+def parse_inbound_message(data):
+    """Return the ``(message_id, phone_number, text)`` of a webhook payload."""
     message = data.get('message', {})
     phone_number = data.get('from', '')
+    message_id = data.get('id') or data.get('message_id')
+    text = message
+    if isinstance(message, dict):
+        message_id = message.get('id') or message_id
+        text = message.get('text') or message.get('body')
+        if isinstance(text, dict):
+            text = text.get('body')
+    return (
+        str(message_id) if message_id else None,
+        str(phone_number),
+        text if isinstance(text, str) else None,
+    )
+
+
+def enqueue_answer(inbound_id):
+    from .tasks import answer_whatsapp_message
+
+    try:
+        answer_whatsapp_message.delay(inbound_id)
+    except Exception:
+        logger.warning("Could not enqueue an answer for message %s", inbound_id, exc_info=True)
+
+
+def answer_inbound_message(inbound):
+    """Answer a stored WhatsApp message from the details of the caller's event."""
+    phone_number = inbound.phone_number
+    phone_e164 = normalize_phone_number(phone_number)
     """ PENDING FUNCTIONALITY TO SEND MESSAGE TO THE CREATOR USER WHEN PEOPLE REGISTER FOR THEIR EVENTS"""
     # try:
-    #     profile = UserProfile.objects.filter(phone_number=phone_number).first()
+    #     profile = UserProfile.objects.filter(phone_e164=phone_e164).first()
     #     if profile:
     #         # This is an event creator
     #         # You can add specific handling for event creators here
@@ -26,46 +99,144 @@ def whatsapp_webhook(request):
             
     #         response_text = f"Hello {profile.user.username}! Here are your events:\n{event_list}"
     #         send_whatsapp_message(phone_number, response_text)
-    #         return Response({"success": True})
+    #         return True
     # except Exception as e:
     #     pass 
-    try:
-        attendee = Attendee.objects.filter(phone_number=phone_number).order_by('-registered_at').first()
-        if not attendee:
-            return Response({"message": "Attendee not found"}, status=400)
-        
-        event = attendee.event
-        
-        # Prepare context for Gemini from event details
-        context = f"Event: {event.title}\nDescription: {event.description}\nDate: {event.date}\nLocation: {event.location}"
-      
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(
-            f"Context about an event: {context}\n\nUser question: {message}\n\nPlease answer based only on the event information provided."
+    attendee = None
+    if phone_e164:
+        attendee = (
+            Attendee.objects.filter(phone_e164=phone_e164)
+            .select_related('event')
+            .order_by('-registered_at')
+            .first()
         )
-        
-        # Send response back to WhatsApp
-        send_whatsapp_message(phone_number, response.text)
-        
-        return Response({"success": True})
-    
-    except Exception as e:
-        return Response({"error": str(e)}, status=500)
+    if not attendee:
+        logger.info("No attendee found for WhatsApp message %s", inbound.message_id)
+        return False
+
+    # Send response back to WhatsApp
+    send_whatsapp_message(phone_number, answer_event_question(attendee.event, inbound.body))
+    return True
+
+
+def answer_event_question(event, question):
+    """Answer ``question`` about ``event`` with Gemini, reusing cached answers."""
+    # Prepare context for Gemini from event details
+    context = (
+        f"Event: {event.title}\nDescription: {event.description}\n"
+        f"Date: {event.date}\nTime: {event.time}\nLocation: {event.location}"
+    )
+    key = (event.id, hashlib.sha256(context.encode()).hexdigest(), normalize_question(question))
+    answer = answer_cache.get(key)
+    if answer is not None:
+        return answer
+
+    response = get_gemini_model().generate_content(
+        f"Context about an event: {context}\n\nUser question: {question}\n\nPlease answer based only on the event information provided."
+    )
+    answer_cache.set(key, response.text)
+    return response.text
+
+
+def normalize_question(question):
+    """Fold case, punctuation and spacing so rephrasings share a cache entry."""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.casefold()).split())
+
+
+@functools.lru_cache(maxsize=None)
+def get_gemini_model():
+    return genai.GenerativeModel('gemini-pro')
+
+
+class WhatsAppRetry(Retry):
+    """Retry policy that honours ``Retry-After`` but never sleeps for too long."""
+
+    max_retry_after = 30
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+def get_whatsapp_session():
+    """Return the process-wide WhatsApp API session.
+
+    The session keeps connections to the provider alive between messages and
+    retries requests the provider turned away (429 and 503), waiting as long
+    as its ``Retry-After`` header asks. Read errors and other 5xx answers are
+    not retried because the message may already have been accepted, and the
+    send API has no idempotency key to drop a second copy.
+    """
+    global _whatsapp_session
+    if _whatsapp_session is None:
+        with _whatsapp_session_lock:
+            if _whatsapp_session is None:
+                retry = WhatsAppRetry(
+                    total=settings.WHATSAPP_MAX_RETRIES,
+                    read=0,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 503),
+                    allowed_methods=frozenset({"POST"}),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(
+                    pool_maxsize=settings.WHATSAPP_POOL_SIZE, max_retries=retry
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    'Authorization': f'Bearer {settings.WHATSAPP_API_TOKEN}',
+                    'Content-Type': 'application/json'
+                })
+                _whatsapp_session = session
+    return _whatsapp_session
+
 
 def send_whatsapp_message(to, message):
-    
-    api_url = settings.WHATSAPP_API_URL
-    headers = {
-        'Authorization': f'Bearer {settings.WHATSAPP_API_TOKEN}',
-        'Content-Type': 'application/json'
-    }
-    
+    """Send a text message and return the provider's JSON response.
+
+    Raises ``requests.RequestException`` when the provider cannot be reached
+    or keeps rejecting the message after the retries.
+    """
     payload = {
         'messaging_product': 'whatsapp',
         'to': to,
         'type': 'text',
         'text': {'body': message}
     }
-    
-    response = requests.post(api_url, json=payload, headers=headers)
-    return response.json()
\ No newline at end of file
+
+    response = get_whatsapp_session().post(
+        settings.WHATSAPP_API_URL,
+        json=payload,
+        timeout=(settings.WHATSAPP_CONNECT_TIMEOUT, settings.WHATSAPP_READ_TIMEOUT),
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def send_whatsapp_messages(messages, max_workers=None):
+    """Send ``(to, message)`` pairs concurrently over the pooled session.
+
+    At most ``WHATSAPP_MAX_CONCURRENCY`` requests are in flight at a time.
+    Returns a success flag for each message, in order.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+
+    def send(item):
+        to, message = item
+        try:
+            send_whatsapp_message(to, message)
+            return True
+        except Exception:
+            logger.exception("Failed to send WhatsApp message to %s", to)
+            return False
+
+    max_workers = min(max_workers or settings.WHATSAPP_MAX_CONCURRENCY, len(messages))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(send, messages))
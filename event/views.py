@@ -1,19 +1,27 @@
 from rest_framework import viewsets, permissions, status, generics
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, action, authentication_classes
 from rest_framework.response import Response
 from django.contrib.auth.models import User
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 import requests
-from django.core.mail import send_mail
+from django.db import transaction
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
 import os
 from .utils import send_whatsapp_message
+from .tasks import wake_email_outbox
 from django.shortcuts import get_object_or_404
 
-from .models import Event, Attendee, Reminder
+from .models import Event, Attendee, Reminder, EmailOutbox
+from .pagination import EventCursorPagination, AttendeeCursorPagination
+from .authentication import CachedTokenAuthentication
+from .cache import public_events_cache
+from .conditional import ConditionalGetMixin
+from .importers import AttendeeImport, read_rows, upload_format
+from .exports import CONTENT_TYPES as EXPORT_FORMATS, stream_attendees
+from .search import EventSearchFilter
 from .serializers import (
     UserSerializer,
     EventSerializer,
@@ -32,9 +40,9 @@ class UserRegistrationView(generics.CreateAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
+            # The token is created with the user, in the same transaction.
             user = serializer.save()
-            # Generate a token for the user
-            token, created = Token.objects.get_or_create(user=user)
+            token = user.auth_token
             return Response(
                 {
                     "user": UserSerializer(
@@ -48,14 +56,15 @@ class UserRegistrationView(generics.CreateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = EventSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = EventCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        return Event.objects.filter(creator=user)
+        return Event.objects.filter(creator=user).with_list_stats()
 
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
@@ -65,25 +74,124 @@ class EventViewSet(viewsets.ModelViewSet):
             return EventDetailSerializer
         return EventSerializer
 
+    def list(self, request, *args, **kwargs):
+        validators = self.list_validators(request, self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(
+            request, validators, lambda: super(EventViewSet, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(
+            request,
+            self.object_validators(request, instance),
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
     @action(detail=True, methods=["get"])
     def attendees(self, request, pk=None):
+        """Page through the attendees, or stream all of them with ``?export=csv|ndjson``."""
+        event = self.get_object()
+        export = request.query_params.get("export")
+        if export:
+            if export not in EXPORT_FORMATS:
+                return Response(
+                    {"export": [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return stream_attendees(event.attendees.all(), export, f"attendees-{event.pk}")
+
+        paginator = AttendeeCursorPagination()
+        page = paginator.paginate_queryset(event.attendees.all(), request, view=self)
+        serializer = AttendeeSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="attendees/import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_attendees(self, request, pk=None):
+        """Register the attendees in an uploaded CSV or NDJSON ``file``.
+
+        The file is read and written in batches, so its size is not limited
+        by memory. Pass ``notify=true`` to queue confirmation emails.
+        """
         event = self.get_object()
-        attendees = event.attendees.all()
-        serializer = AttendeeSerializer(attendees, many=True)
-        return Response(serializer.data)
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": ["No file was submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = upload_format(upload)
+        if fmt is None:
+            return Response(
+                {"file": ["Upload a .csv or .ndjson file."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        notify = str(request.data.get("notify", "")).lower() in ("1", "true", "yes")
+        report = AttendeeImport(event, notify=notify).run(read_rows(upload, fmt))
+        return Response(report, status=status.HTTP_201_CREATED if report["created"] else status.HTTP_200_OK)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path=r"attendees/(?P<attendee_id>[0-9a-fA-F-]{32,36})/cancel",
+    )
+    def cancel_attendee(self, request, pk=None, attendee_id=None):
+        """Cancel a registration and promote the first attendee on the waitlist."""
+        event = self.get_object()
+        attendee = get_object_or_404(event.attendees, pk=attendee_id)
+        with transaction.atomic():
+            promoted = attendee.cancel()
+            if promoted is not None:
+                EmailOutbox.objects.create(
+                    attendee=promoted,
+                    recipient=promoted.email,
+                    subject=f"A seat opened up for {event.title}",
+                    body=f"Good news, a seat opened up and your registration for {event.title} is now confirmed",
+                )
+                transaction.on_commit(wake_email_outbox)
 
+        return Response(
+            {
+                "cancelled": attendee_id,
+                "promoted": AttendeeSerializer(promoted).data if promoted else None,
+            }
+        )
 
-class PublicEventListView(generics.ListAPIView):
+
+class PublicEventListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = EventSerializer
-    queryset = Event.objects.all()
+    queryset = Event.objects.with_list_stats()
+    pagination_class = EventCursorPagination
+    filter_backends = [EventSearchFilter]
 
     permission_classes = [permissions.AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        """Serve the page from the shared cache; it is the same for everyone.
+
+        The validators are cached with the page so a stale copy served during
+        a refresh is never paired with a newer ETag.
+        """
+
+        def render():
+            queryset = self.filter_queryset(self.get_queryset())
+            validators = self.list_validators(request, queryset)
+            data = super(PublicEventListView, self).list(request, *args, **kwargs).data
+            return validators, data
+
+        validators, data = public_events_cache.get_or_compute(
+            request.build_absolute_uri(), render
+        )
+        return self.conditional_response(request, validators, lambda: Response(data))
+
 
 class AttendeeView(generics.ListAPIView):
     serializer_class = AttendeeSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = AttendeeCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -107,35 +215,11 @@ class EventRegistrationView(generics.GenericAPIView):
 
         event = get_object_or_404(Event, registration_link=registration_link)
         whatsapp_number = request.data.get("phone_number")
-        attendee = request.data.get("email")
-        serializer = self.get_serializer(
-            data=request.data, context={"event_id": event.id}
-        )
+        serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-
-            # Send confirmation email
-            message = f"Thank you for registering for {event.title}, We look forward to seeing you at the event"
-
-            try:
-                send_mail(
-                    subject=f"You have Successfully registered for {event.title}",
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[attendee],
-                    fail_silently=False,
-                )
-
-                # # Create a reminder record
-                # Reminder.objects.create(
-                #     attendee=attendee,
-                #     message=message,
-                #     type='EMAIL'
-                # )
+            register_attendee(serializer, event)
 
-            except Exception as e:
-                print(f"Failed to send email reminder: {str(e)}")
             # try:
             #     send_whatsapp_message(whatsapp_number, message)
             # except Exception as e:
@@ -145,7 +229,22 @@ class EventRegistrationView(generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def register_attendee(serializer, event):
+    """Save a validated registration and queue its email in one transaction.
+
+    The email is sent by the outbox dispatcher instead of on the request path.
+    """
+    with transaction.atomic():
+        attendee = serializer.save(event=event)
+        EmailOutbox.registration(attendee, event).save()
+        transaction.on_commit(wake_email_outbox)
+    return attendee
+
+
+@api_view(["POST"])
+@authentication_classes([CachedTokenAuthentication])
 def logout(request):
+    """Delete the caller's token, which also drops it from the token cache."""
     try:
         request.user.auth_token.delete()
         return Response(
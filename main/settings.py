@@ -59,6 +59,17 @@ CLOUDINARY_STORAGE = {
     'API_SECRET': os.getenv('api_secret')
   
 }
+
+# Storage class for event flyers; FileSystemStorage stands in for Cloudinary locally
+FLYER_STORAGE = os.environ.get('FLYER_STORAGE', 'cloudinary_storage.storage.MediaCloudinaryStorage')
+# Save uploaded flyers to FLYER_STAGING_ROOT and let a worker move them to FLYER_STORAGE.
+# The directory must be shared by the web and worker processes.
+DEFERRED_FLYER_UPLOADS = os.environ.get('DEFERRED_FLYER_UPLOADS', 'False').lower() in ('1', 'true', 'yes')
+FLYER_STAGING_ROOT = os.environ.get('FLYER_STAGING_ROOT', str(BASE_DIR / 'flyer-staging'))
+
+# Resized WebP copies made of every flyer: name -> (max width, max height)
+FLYER_VARIANTS = {'thumb': (320, 320), 'card': (800, 450)}
+FLYER_VARIANT_QUALITY = int(os.environ.get('FLYER_VARIANT_QUALITY', 80))
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME":timedelta(days=2)
@@ -110,14 +121,60 @@ WSGI_APPLICATION = 'main.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite runs one writer at a time. IMMEDIATE transactions take the write
+# lock when they begin, so concurrent requests wait for it (up to `timeout`
+# seconds) instead of failing when a reader tries to become a writer. The test
+# database is a file so that threaded tests share it the same way.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test-db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# Redis when REDIS_CACHE_URL is set, otherwise a per-process local-memory cache
+
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Serve the hot endpoints from event/async_views.py; only worth it under ASGI
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False').lower() in ('1', 'true', 'yes')
+
+# Threads that hash passwords for the async signup view (default: CPU count)
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None
+
+# Seconds a resolved auth token is cached in the shared cache, and in each
+# process (0 disables a tier). Neither tier is invalidated across workers
+# without Redis, so token caching is off by default in that case.
+TOKEN_AUTH_CACHE_TTL = int(
+    os.environ.get('TOKEN_AUTH_CACHE_TTL', 300 if os.environ.get('REDIS_CACHE_URL') else 0)
+)
+TOKEN_AUTH_LOCAL_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_LOCAL_CACHE_TTL', 0))
+
+# Seconds a cached /api/public-events/ page is served before it is refreshed
+PUBLIC_EVENTS_CACHE_TTL = int(os.environ.get('PUBLIC_EVENTS_CACHE_TTL', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -160,11 +217,22 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Country code assumed for phone numbers written with a leading trunk 0
+PHONE_DEFAULT_COUNTRY_CODE = os.environ.get('PHONE_DEFAULT_COUNTRY_CODE', '234')
+
 WHATSAPP_API_URL = os.environ.get('WHATSAPP_API_URL', '')
 WHATSAPP_API_TOKEN = os.environ.get('WHATSAPP_API_TOKEN', '')
+WHATSAPP_CONNECT_TIMEOUT = float(os.environ.get('WHATSAPP_CONNECT_TIMEOUT', 5))
+WHATSAPP_READ_TIMEOUT = float(os.environ.get('WHATSAPP_READ_TIMEOUT', 15))
+WHATSAPP_MAX_RETRIES = int(os.environ.get('WHATSAPP_MAX_RETRIES', 3))
+WHATSAPP_MAX_CONCURRENCY = int(os.environ.get('WHATSAPP_MAX_CONCURRENCY', 8))
+WHATSAPP_POOL_SIZE = int(os.environ.get('WHATSAPP_POOL_SIZE', 10))
 
 # Gemini AI API
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+# In-process cache of answers per event and question
+GEMINI_ANSWER_CACHE_SIZE = int(os.environ.get('GEMINI_ANSWER_CACHE_SIZE', 1024))
+GEMINI_ANSWER_CACHE_TTL = int(os.environ.get('GEMINI_ANSWER_CACHE_TTL', 6 * 60 * 60))
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -175,6 +243,8 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+# Bulk senders reuse one SMTP session for up to this many messages
+EMAIL_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get('EMAIL_MAX_MESSAGES_PER_CONNECTION', 100))
 
 
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -184,10 +254,42 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
-# Schedule for the reminder task to run daily
+# How long before an event starts its reminders are sent, in minutes
+REMINDER_OFFSETS = [
+    timedelta(minutes=int(minutes))
+    for minutes in os.environ.get('REMINDER_OFFSETS_MINUTES', '1440,60').split(',')
+]
+
+# Number of attendees handled by each reminder delivery task
+REMINDER_CHUNK_SIZE = int(os.environ.get('REMINDER_CHUNK_SIZE', 500))
+
+# Bulk attendee imports: rows per insert batch, and row errors kept in the report
+ATTENDEE_IMPORT_BATCH_SIZE = int(os.environ.get('ATTENDEE_IMPORT_BATCH_SIZE', 500))
+ATTENDEE_IMPORT_MAX_ERRORS = int(os.environ.get('ATTENDEE_IMPORT_MAX_ERRORS', 1000))
+
+# Rows fetched per round trip when streaming an attendee export
+ATTENDEE_EXPORT_CHUNK_SIZE = int(os.environ.get('ATTENDEE_EXPORT_CHUNK_SIZE', 2000))
+
+# Transactional email outbox
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+
+# Periodic tasks; send_event_reminders only reads the reminders that are due
 CELERY_BEAT_SCHEDULE = {
     'send-event-reminders': {
-        'task': '.tasks.send_event_reminders',
-        'schedule': timedelta(hours=24),
+        'task': 'event.tasks.send_event_reminders',
+        'schedule': timedelta(minutes=1),
+    },
+    'dispatch-email-outbox': {
+        'task': 'event.tasks.dispatch_email_outbox',
+        'schedule': timedelta(minutes=1),
+    },
+    'transfer-pending-flyers': {
+        'task': 'event.tasks.transfer_pending_flyers',
+        'schedule': timedelta(minutes=10),
+    },
+    'answer-unanswered-messages': {
+        'task': 'event.tasks.answer_unanswered_messages',
+        'schedule': timedelta(minutes=5),
     },
 }